@@ -1,5 +1,13 @@
 """ Module with main AES-128 functions. """
+from functools import lru_cache
+
 import aes.transformations as aes
+import aes.t_tables as t_tables
+
+REFERENCE_ENGINE = 'reference'
+T_TABLE_ENGINE = 't-table'
+ENGINES = (REFERENCE_ENGINE, T_TABLE_ENGINE)
+DEFAULT_ENGINE = T_TABLE_ENGINE
 
 
 def get_state_from_data(data):
@@ -34,34 +42,145 @@ def get_data_from_state(state):
     return data
 
 
-def encrypt(data, key):
+class Cipher:
     """
-    Encryption function.
+    AES-128 cipher bound to one key. Key schedule is expanded once on creation and reused for every block.
+    Rounds are computed by one of ENGINES, all engines give identical output.
+    Blocks are accepted as bytes (result is bytes) or as list of ints (result is list of ints).
+    """
+    def __init__(self, key, engine=DEFAULT_ENGINE):
+        """
+        Cipher initialization.
+
+        :param key: master password or raw key of 16 bytes
+        :type key: str or bytes
+        :param engine: round engine, one of ENGINES
+        :type engine: str
+        """
+        if engine not in ENGINES:
+            raise ValueError('Unknown engine "{}". Supported engines: {}.'.format(engine, ', '.join(ENGINES)))
+        self.engine = engine
+        self.key_schedule = aes.key_expansion(key)
+        self.round_keys = [aes.get_round_key_flat(self.key_schedule, i) for i in range(aes.NR + 1)]
+        # decryption walks the schedule backwards
+        self.reverse_round_keys = self.round_keys[::-1]
+        self.round_words, self.reverse_round_words = t_tables.get_round_words(self.key_schedule)
+
+    def encrypt(self, data):
+        """
+        Method to encrypt one block.
+
+        :param data: data to encrypt
+        :type data: bytes or list of ints
+        :return: encrypted data
+        :rtype: bytes or list of ints
+        """
+        if self.engine == T_TABLE_ENGINE:
+            encrypted = t_tables.encrypt_block(data, self.round_words)
+        else:
+            encrypted = self.__encrypt_state(bytearray(data))
+        return list(encrypted) if isinstance(data, list) else encrypted
+
+    def decrypt(self, data):
+        """
+        Method to decrypt one block.
+
+        :param data: data to decrypt
+        :type data: bytes or list of ints
+        :return: decrypted data
+        :rtype: bytes or list of ints
+        """
+        if self.engine == T_TABLE_ENGINE:
+            decrypted = t_tables.decrypt_block(data, self.reverse_round_words)
+        else:
+            decrypted = self.__decrypt_state(bytearray(data))
+        return list(decrypted) if isinstance(data, list) else decrypted
+
+    def __encrypt_state(self, state):
+        """
+        Private method to encrypt flat state in place with reference transformations.
+
+        :param state: data block to encrypt
+        :type state: bytearray
+        :return: encrypted data
+        :rtype: bytes
+        """
+        round_keys = self.round_keys
+        aes.add_round_key_flat(state, round_keys[0])
+
+        for i in range(1, aes.NR):  # NR-1 rounds
+            aes.sub_bytes_flat(state)
+            aes.shift_rows_flat(state)
+            aes.mix_columns_flat(state)
+            aes.add_round_key_flat(state, round_keys[i])
+
+        # last round
+        aes.sub_bytes_flat(state)
+        aes.shift_rows_flat(state)
+        aes.add_round_key_flat(state, round_keys[aes.NR])
+        return bytes(state)
+
+    def __decrypt_state(self, state):
+        """
+        Private method to decrypt flat state in place with reference transformations.
+
+        :param state: data block to decrypt
+        :type state: bytearray
+        :return: decrypted data
+        :rtype: bytes
+        """
+        round_keys = self.reverse_round_keys
+        aes.add_round_key_flat(state, round_keys[0])
+
+        for i in range(1, aes.NR):
+            aes.shift_rows_flat(state, reverse=True)
+            aes.sub_bytes_flat(state, reverse=True)
+            aes.add_round_key_flat(state, round_keys[i])
+            aes.mix_columns_flat(state, reverse=True)
+
+        aes.shift_rows_flat(state, reverse=True)
+        aes.sub_bytes_flat(state, reverse=True)
+        aes.add_round_key_flat(state, round_keys[aes.NR])
+        return bytes(state)
+
+
+CIPHER_CACHE_SIZE = 16
+
+
+@lru_cache(maxsize=CIPHER_CACHE_SIZE)
+def get_cipher(key, engine=DEFAULT_ENGINE):
+    """
+    Function to get cipher for key. The last CIPHER_CACHE_SIZE ciphers are cached,
+    so repeated calls with the same master password do not expand the key again.
 
-    :param data: data to encrypt
-    :type data: list of ints
     :param key: master password
     :type key: str
-    :return: encrypted data
+    :param engine: round engine, one of ENGINES
+    :type engine: str
+    :return: cipher for key
+    :rtype: Cipher
     """
-    state = get_state_from_data(data)
+    return Cipher(key, engine)
+
 
-    key_schedule = aes.key_expansion(key)
-    state = aes.add_round_key(state, key_schedule)
+def clear_cipher_cache():
+    """
+    Function to drop all cached ciphers (and their key schedules) from memory.
+    """
+    get_cipher.cache_clear()
 
-    for i in range(1, aes.NR):  # NR-1 rounds
-        state = aes.sub_bytes(state)
-        state = aes.shift_rows(state)
-        state = aes.mix_columns(state)
-        state = aes.add_round_key(state, key_schedule, round_number=i)
 
-    # last round
-    state = aes.sub_bytes(state)
-    state = aes.shift_rows(state)
-    state = aes.add_round_key(state, key_schedule, aes.NR)
+def encrypt(data, key):
+    """
+    Encryption function.
 
-    encrypted = get_data_from_state(state)
-    return encrypted
+    :param data: data to encrypt
+    :type data: bytes or list of ints
+    :param key: master password
+    :type key: str
+    :return: encrypted data
+    """
+    return get_cipher(key).encrypt(data)
 
 
 def decrypt(data, key):
@@ -69,27 +188,12 @@ def decrypt(data, key):
     Decryption function.
 
     :param data: data to decrypt
-    :type data: list of ints
+    :type data: bytes or list of ints
     :param key: master password
     :type key: str
     :return: decrypted data
     """
-    state = get_state_from_data(data)
-    key_schedule = aes.key_expansion(key)
-    state = aes.add_round_key(state, key_schedule, aes.NR)
-
-    for i in range(aes.NR - 1, 0, -1):
-        state = aes.shift_rows(state, reverse=True)
-        state = aes.sub_bytes(state, reverse=True)
-        state = aes.add_round_key(state, key_schedule, round_number=i)
-        state = aes.mix_columns(state, reverse=True)
-
-    state = aes.shift_rows(state, reverse=True)
-    state = aes.sub_bytes(state, reverse=True)
-    state = aes.add_round_key(state, key_schedule)
-
-    decrypted = get_data_from_state(state)
-    return decrypted
+    return get_cipher(key).decrypt(data)
 
 
 def message_to_blocks(message, check_for_invalid=True):
@@ -156,3 +260,28 @@ def message_to_bytes(encrypted_string):
             result.append(row)
             row = []
     return result
+
+
+def blocks_to_bytes(blocks):
+    """
+    Function to join set of blocks into one bytes buffer.
+
+    :param blocks: blocks set
+    :type blocks: list of lists
+    :return: joined blocks
+    :rtype: bytes
+    """
+    return bytes(symbol for block in blocks for symbol in block)
+
+
+def bytes_to_blocks(data):
+    """
+    Function to split bytes buffer into set of blocks.
+
+    :param data: bytes buffer with length multiple of block size
+    :type data: bytes
+    :return: blocks set
+    :rtype: list of lists
+    """
+    block_size = aes.R * aes.NB
+    return [list(data[i:i + block_size]) for i in range(0, len(data), block_size)]
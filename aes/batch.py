@@ -0,0 +1,367 @@
+""" Module with AES-128 encryption of many blocks at once. """
+import importlib.util
+import sys
+
+from aes import aes
+from aes.tables import S_BOX_BYTES, REVERSE_S_BOX_BYTES
+from aes.transformations import R, NB, NR, MIX_COLUMNS_TABLES, REVERSE_MIX_COLUMNS_TABLES
+
+# NumPy is imported on first use of numpy engine (see _import_numpy), it takes longer than the rest of
+# application to import; buffer engine is used instead if it is not installed
+HAS_NUMPY = importlib.util.find_spec('numpy') is not None
+numpy = None
+
+BLOCK_SIZE = R * NB
+
+NUMPY_ENGINE = 'numpy'    # every round over (N, 16) array
+BUFFER_ENGINE = 'buffer'  # every round over whole bytes buffer with bytes.translate and big int xor
+# aes.ENGINES process buffer block by block
+BATCH_ENGINES = ((NUMPY_ENGINE,) if HAS_NUMPY else ()) + (BUFFER_ENGINE,) + aes.ENGINES
+DEFAULT_BATCH_ENGINE = BATCH_ENGINES[0]
+# batch engines have fixed cost per call, fewer blocks are processed faster block by block
+SMALL_BATCH_BLOCKS = 20
+SMALL_BATCH_ENGINE = aes.T_TABLE_ENGINE
+
+
+def select_engine(data):
+    """
+    Function to select engine by number of blocks: SMALL_BATCH_ENGINE for less than SMALL_BATCH_BLOCKS blocks,
+    DEFAULT_BATCH_ENGINE otherwise.
+
+    :param data: blocks to process
+    :type data: numpy.ndarray or bytes
+    :return: one of BATCH_ENGINES
+    :rtype: str
+    """
+    size = data.nbytes if hasattr(data, 'nbytes') else len(data)
+    return SMALL_BATCH_ENGINE if size < SMALL_BATCH_BLOCKS * BLOCK_SIZE else DEFAULT_BATCH_ENGINE
+
+
+def encrypt_blocks(data, key, engine=None):
+    """
+    Function to encrypt many blocks at once.
+
+    :param data: blocks to encrypt, (N, 16) uint8 array or bytes with length multiple of 16
+    :type data: numpy.ndarray or bytes
+    :param key: master password
+    :type key: str
+    :param engine: batch engine, one of BATCH_ENGINES, it is selected by data size if it is not set
+    :type engine: str
+    :return: encrypted blocks, same type as data
+    :rtype: numpy.ndarray or bytes
+    """
+    if engine is None:
+        engine = select_engine(data)
+    cipher = aes.get_cipher(key)
+    if engine == NUMPY_ENGINE:
+        return _process_array(data, lambda state: _encrypt_array(state, _get_round_keys(cipher)))
+    if engine == BUFFER_ENGINE:
+        return _process_bytes(data, lambda buffer: _encrypt_buffer(buffer, cipher.round_keys))
+    return _process_bytes(data, lambda buffer: _process_blocks(buffer, aes.get_cipher(key, engine).encrypt))
+
+
+def decrypt_blocks(data, key, engine=None):
+    """
+    Function to decrypt many blocks at once.
+
+    :param data: blocks to decrypt, (N, 16) uint8 array or bytes with length multiple of 16
+    :type data: numpy.ndarray or bytes
+    :param key: master password
+    :type key: str
+    :param engine: batch engine, one of BATCH_ENGINES, it is selected by data size if it is not set
+    :type engine: str
+    :return: decrypted blocks, same type as data
+    :rtype: numpy.ndarray or bytes
+    """
+    if engine is None:
+        engine = select_engine(data)
+    cipher = aes.get_cipher(key)
+    if engine == NUMPY_ENGINE:
+        return _process_array(data, lambda state: _decrypt_array(state, _get_round_keys(cipher)[::-1]))
+    if engine == BUFFER_ENGINE:
+        return _process_bytes(data, lambda buffer: _decrypt_buffer(buffer, cipher.reverse_round_keys))
+    return _process_bytes(data, lambda buffer: _process_blocks(buffer, aes.get_cipher(key, engine).decrypt))
+
+
+def _check_length(length):
+    """
+    Function to check that data can be split into blocks.
+
+    :param length: data length in bytes
+    :type length: int
+    """
+    if length % BLOCK_SIZE != 0:
+        raise ValueError('Data length is {}. Required length is multiple of {}.'.format(length, BLOCK_SIZE))
+
+
+def _check_shape(data):
+    """
+    Function to check that array has (N, 16) shape.
+
+    :param data: array to check
+    :type data: numpy.ndarray
+    """
+    if data.ndim != 2 or data.shape[1] != BLOCK_SIZE:
+        raise ValueError('Data shape is {}. Required shape is (N, {}).'.format(data.shape, BLOCK_SIZE))
+
+
+def _process_bytes(data, process_buffer):
+    """
+    Function to process blocks as one bytes buffer.
+
+    :param data: blocks to process
+    :type data: numpy.ndarray or bytes
+    :param process_buffer: function to process bytes buffer
+    :return: processed blocks, same type as data
+    :rtype: numpy.ndarray or bytes
+    """
+    if _is_array(data):
+        _import_numpy()  # caller has imported NumPy, numpy engine could be never used yet
+        _check_shape(data)
+        result = process_buffer(data.astype(numpy.uint8).tobytes())
+        return numpy.frombuffer(result, dtype=numpy.uint8).reshape(-1, BLOCK_SIZE)
+
+    data = bytes(data)
+    _check_length(len(data))
+    return process_buffer(data)
+
+
+def _process_blocks(data, process_block):
+    """
+    Function to process bytes block by block.
+
+    :param data: blocks to process
+    :type data: bytes
+    :param process_block: function to process one block
+    :return: processed blocks
+    :rtype: bytes
+    """
+    result = bytearray()
+    for begin in range(0, len(data), BLOCK_SIZE):
+        result.extend(process_block(data[begin:begin + BLOCK_SIZE]))
+    return bytes(result)
+
+
+def _process_array(data, process_state):
+    """
+    Function to process blocks as (N, 16) array.
+
+    :param data: blocks to process
+    :type data: numpy.ndarray or bytes
+    :param process_state: function to process (N, 16) array
+    :return: processed blocks, same type as data
+    :rtype: numpy.ndarray or bytes
+    """
+    if not HAS_NUMPY:
+        raise RuntimeError('Engine "{}" requires NumPy.'.format(NUMPY_ENGINE))
+    _import_numpy()
+
+    if isinstance(data, numpy.ndarray):
+        _check_shape(data)
+        return process_state(data.astype(numpy.uint8))
+
+    _check_length(len(data))
+    state = numpy.frombuffer(bytes(data), dtype=numpy.uint8).reshape(-1, BLOCK_SIZE)
+    return process_state(state).tobytes()
+
+
+def _is_array(data):
+    """
+    Function to check if data is NumPy array, NumPy is not imported for the check
+    (data can be an array only if NumPy is already imported).
+
+    :param data: blocks
+    :type data: numpy.ndarray or bytes
+    :return: check result
+    :rtype: bool
+    """
+    return 'numpy' in sys.modules and isinstance(data, sys.modules['numpy'].ndarray)
+
+
+def _import_numpy():
+    """
+    Function to import NumPy and make lookup arrays of numpy engine once.
+    """
+    global numpy, S_BOX_ARRAY, REVERSE_S_BOX_ARRAY, MIX_COLUMNS, REVERSE_MIX_COLUMNS
+    if numpy is not None:
+        return
+    import numpy as module
+    S_BOX_ARRAY = module.frombuffer(S_BOX_BYTES, dtype=module.uint8)
+    REVERSE_S_BOX_ARRAY = module.frombuffer(REVERSE_S_BOX_BYTES, dtype=module.uint8)
+    # first row of (reverse) GF matrix, each next row is the same row rotated
+    MIX_COLUMNS = [module.array(table, dtype=module.uint8) for table in MIX_COLUMNS_TABLES[0]]
+    REVERSE_MIX_COLUMNS = [module.array(table, dtype=module.uint8) for table in REVERSE_MIX_COLUMNS_TABLES[0]]
+    numpy = module  # set last, so other threads do not use arrays before they are made
+
+
+def _get_round_keys(cipher):
+    """
+    Function to get round keys of cipher as (NR + 1, 16) array in state byte order.
+
+    :param cipher: cipher with expanded key
+    :type cipher: aes.Cipher
+    :return: round keys
+    :rtype: numpy.ndarray
+    """
+    return numpy.frombuffer(b''.join(cipher.round_keys), dtype=numpy.uint8).reshape(NR + 1, R * NB)
+
+
+def _encrypt_array(state, round_keys):
+    """
+    Function to encrypt (N, 16) array.
+
+    :param state: blocks to encrypt
+    :param round_keys: round keys from _get_round_keys
+    :return: encrypted blocks
+    """
+    state = state ^ round_keys[0]
+    for i in range(1, NR):  # NR-1 rounds
+        state = S_BOX_ARRAY[state][:, SHIFT_ROWS]
+        state = _mix_columns(state, MIX_COLUMNS)
+        state ^= round_keys[i]
+
+    # last round
+    state = S_BOX_ARRAY[state][:, SHIFT_ROWS]
+    state ^= round_keys[NR]
+    return state
+
+
+def _decrypt_array(state, round_keys):
+    """
+    Function to decrypt (N, 16) array.
+
+    :param state: blocks to decrypt
+    :param round_keys: reversed round keys from _get_round_keys
+    :return: decrypted blocks
+    """
+    state = state ^ round_keys[0]
+    for i in range(1, NR):
+        state = REVERSE_S_BOX_ARRAY[state[:, REVERSE_SHIFT_ROWS]]
+        state ^= round_keys[i]
+        state = _mix_columns(state, REVERSE_MIX_COLUMNS)
+
+    state = REVERSE_S_BOX_ARRAY[state[:, REVERSE_SHIFT_ROWS]]
+    state ^= round_keys[NR]
+    return state
+
+
+def _mix_columns(state, tables):
+    """
+    Function to mix columns of all blocks at once.
+
+    :param state: (N, 16) array
+    :param tables: multiplication tables for each row of GF matrix row
+    :return: (N, 16) array with mixed columns
+    """
+    columns = state.reshape(-1, NB, R)  # block, column, row
+    result = tables[0][columns]
+    for shift in range(1, R):
+        result ^= tables[shift][numpy.roll(columns, -shift, axis=2)]
+    return result.reshape(-1, NB * R)
+
+
+def _permute(buffer, permutation):
+    """
+    Function to move bytes of every block in buffer: result[i] = buffer[permutation[i]].
+
+    :param buffer: blocks
+    :type buffer: bytes
+    :param permutation: 16 source positions
+    :type permutation: list
+    :return: permuted blocks
+    :rtype: bytearray
+    """
+    result = bytearray(len(buffer))
+    for i, source in enumerate(permutation):
+        result[i::BLOCK_SIZE] = buffer[source::BLOCK_SIZE]
+    return result
+
+
+def _xor(buffers, key):
+    """
+    Function to xor buffers of equal length and key as big ints.
+
+    :param buffers: buffers to xor
+    :type buffers: list
+    :param key: round key repeated for every block, as int
+    :type key: int
+    :return: xor result
+    :rtype: bytes
+    """
+    length = len(buffers[0])
+    result = key
+    for buffer in buffers:
+        result ^= int.from_bytes(buffer, 'little')
+    return result.to_bytes(length, 'little')
+
+
+def _get_key_ints(round_keys, count):
+    """
+    Function to get round keys repeated for count blocks as ints.
+
+    :param round_keys: round keys in flat state order
+    :type round_keys: list of bytes
+    :param count: number of blocks
+    :type count: int
+    :return: round keys as ints
+    :rtype: list of ints
+    """
+    return [int.from_bytes(round_key * count, 'little') for round_key in round_keys]
+
+
+def _encrypt_buffer(buffer, round_keys):
+    """
+    Function to encrypt whole buffer. SubBytes is folded into MixColumns translate tables
+    and ShiftRows into permutations of every MixColumns term.
+
+    :param buffer: blocks to encrypt
+    :type buffer: bytes
+    :param round_keys: round keys in flat state order
+    :type round_keys: list of bytes
+    :return: encrypted blocks
+    :rtype: bytes
+    """
+    keys = _get_key_ints(round_keys, len(buffer) // BLOCK_SIZE)
+    state = _xor([buffer], keys[0])
+    for i in range(1, NR):  # NR-1 rounds
+        state = _xor([_permute(state, permutation).translate(table)
+                      for permutation, table in zip(SHIFT_MIX_PERMUTATIONS, SUB_MIX_TABLES)], keys[i])
+
+    # last round
+    return _xor([_permute(state, SHIFT_ROWS).translate(S_BOX_BYTES)], keys[NR])
+
+
+def _decrypt_buffer(buffer, round_keys):
+    """
+    Function to decrypt whole buffer.
+
+    :param buffer: blocks to decrypt
+    :type buffer: bytes
+    :param round_keys: reversed round keys in flat state order
+    :type round_keys: list of bytes
+    :return: decrypted blocks
+    :rtype: bytes
+    """
+    keys = _get_key_ints(round_keys, len(buffer) // BLOCK_SIZE)
+    state = _xor([buffer], keys[0])
+    for i in range(1, NR):
+        state = _xor([_permute(state, REVERSE_SHIFT_ROWS).translate(REVERSE_S_BOX_BYTES)], keys[i])
+        state = _xor([_permute(state, permutation).translate(table)
+                      for permutation, table in zip(MIX_PERMUTATIONS, REVERSE_MIX_TABLES)], 0)
+
+    return _xor([_permute(state, REVERSE_SHIFT_ROWS).translate(REVERSE_S_BOX_BYTES)], keys[NR])
+
+
+# byte positions in flat state are row + R * column
+SHIFT_ROWS = [row + R * ((column + row) % NB) for column in range(NB) for row in range(R)]
+REVERSE_SHIFT_ROWS = [row + R * ((column - row) % NB) for column in range(NB) for row in range(R)]
+
+# MixColumns as sum of R terms: term k multiplies byte of row (row + k) by k-th factor of first GF matrix row
+MIX_PERMUTATIONS = [[(row + shift) % R + R * column for column in range(NB) for row in range(R)]
+                    for shift in range(R)]
+SHIFT_MIX_PERMUTATIONS = [[SHIFT_ROWS[source] for source in permutation] for permutation in MIX_PERMUTATIONS]
+SUB_MIX_TABLES = [bytes(table[s] for s in S_BOX_BYTES) for table in MIX_COLUMNS_TABLES[0]]
+REVERSE_MIX_TABLES = [bytes(table) for table in REVERSE_MIX_COLUMNS_TABLES[0]]
+
+# numpy engine lookup arrays, they are made by _import_numpy
+S_BOX_ARRAY = REVERSE_S_BOX_ARRAY = MIX_COLUMNS = REVERSE_MIX_COLUMNS = None
@@ -0,0 +1,145 @@
+""" Module with authenticated encryption of streams: AES-128 CTR encrypt-then-MAC with HMAC-SHA256. """
+import hashlib
+import hmac
+import os
+import struct
+
+from aes import kdf, modes
+
+# encrypted stream:
+#
+#   | header | segment | segment | ... | final segment |
+#
+# header  - nonce and segment size,
+# segment - segment size bytes of CTR ciphertext and tag, final segment is shorter (can be empty),
+# tag     - truncated HMAC-SHA256 of header, segment number, final flag and segment ciphertext.
+#
+# Every segment is checked before it is decrypted, so only authenticated data is written and decryption
+# stops at the first changed segment. Final flag and segment numbers detect truncated and reordered streams.
+# Key is a raw key derived from password (see aes.kdf.derive_key): passwords are not accepted, because
+# stream tags would let anyone check password guesses without the cost of key derivation.
+HEADER = struct.Struct('>{}sI'.format(modes.NONCE_SIZE))
+SEGMENT_INFO = struct.Struct('>Q?')
+TAG_SIZE = 16
+DEFAULT_SEGMENT_SIZE = modes.DEFAULT_BUFFER_SIZE
+
+
+def encrypt_stream(source, destination, key, segment_size=DEFAULT_SEGMENT_SIZE):
+    """
+    Function to encrypt source stream to destination stream and authenticate it.
+    Only one segment is held in memory.
+
+    :param source: binary file-like object to read plain data from
+    :param destination: binary file-like object to write encrypted data to
+    :param key: raw key of kdf.KEY_SIZE bytes derived from password
+    :type key: bytes
+    :param segment_size: bytes of plain data per tag, multiple of modes.BLOCK_SIZE
+    :type segment_size: int
+    :return: number of written bytes
+    :rtype: int
+    """
+    _check_key(key)
+    if segment_size <= 0 or segment_size % modes.BLOCK_SIZE != 0:
+        raise ValueError('Segment size is {}. Required size is multiple of {}.'.format(
+            segment_size, modes.BLOCK_SIZE))
+    header = HEADER.pack(os.urandom(modes.NONCE_SIZE), segment_size)
+    nonce = header[:modes.NONCE_SIZE]
+    mac = hmac.new(get_mac_key(key), header, hashlib.sha256)
+
+    destination.write(header)
+    written = len(header)
+    number = 0
+    while True:
+        chunk = modes.read_chunk(source, segment_size)
+        final = len(chunk) < segment_size
+        encrypted = modes.ctr_crypt(chunk, key, nonce, number * segment_size)
+        segment = encrypted + _get_tag(mac, number, final, encrypted)
+        destination.write(segment)
+        written += len(segment)
+        if final:
+            return written
+        number += 1
+
+
+def decrypt_stream(source, destination, key):
+    """
+    Function to check and decrypt source stream to destination stream.
+    Every segment is read once and is checked before it is decrypted, ValueError is raised on the first
+    changed segment (segments before it are already written).
+
+    :param source: binary file-like object to read encrypted data from
+    :param destination: binary file-like object to write plain data to
+    :param key: raw key used for encryption
+    :type key: bytes
+    :return: number of written bytes
+    :rtype: int
+    """
+    _check_key(key)
+    header = modes.read_chunk(source, HEADER.size)
+    if len(header) < HEADER.size:
+        raise ValueError('Encrypted stream is too short.')
+    nonce, segment_size = HEADER.unpack(header)
+    if segment_size <= 0 or segment_size % modes.BLOCK_SIZE != 0:
+        raise ValueError('Invalid segment size {}.'.format(segment_size))
+    mac = hmac.new(get_mac_key(key), header, hashlib.sha256)
+
+    written = 0
+    number = 0
+    while True:
+        chunk = modes.read_chunk(source, segment_size + TAG_SIZE)
+        final = len(chunk) < segment_size + TAG_SIZE
+        if len(chunk) < TAG_SIZE:
+            raise ValueError('Encrypted stream is truncated.')
+        encrypted, tag = chunk[:-TAG_SIZE], chunk[-TAG_SIZE:]
+        if not hmac.compare_digest(tag, _get_tag(mac, number, final, encrypted)):
+            raise ValueError('Segment {} authentication failed.'.format(number))
+        destination.write(modes.ctr_crypt(encrypted, key, nonce, number * segment_size))
+        written += len(encrypted)
+        if final:
+            return written
+        number += 1
+
+
+def get_mac_key(key):
+    """
+    Function to get MAC key for cipher key, so cipher key is not used directly in HMAC.
+
+    :param key: raw key
+    :type key: bytes
+    :return: MAC key
+    :rtype: bytes
+    """
+    return hashlib.sha256(b'etm mac key:' + key).digest()
+
+
+def _check_key(key):
+    """
+    Function to check that key is raw key and not password.
+
+    :param key: raw key
+    :type key: bytes
+    """
+    if not isinstance(key, bytes) or len(key) != kdf.KEY_SIZE:
+        raise ValueError('Key must be {} bytes derived with aes.kdf, passwords are not accepted.'.format(
+            kdf.KEY_SIZE))
+
+
+def _get_tag(mac, number, final, encrypted):
+    """
+    Function to compute segment tag.
+
+    :param mac: HMAC already updated with stream header
+    :type mac: hmac.HMAC
+    :param number: segment number
+    :type number: int
+    :param final: flag of the final segment
+    :type final: bool
+    :param encrypted: segment ciphertext
+    :type encrypted: bytes
+    :return: truncated HMAC-SHA256
+    :rtype: bytes
+    """
+    mac = mac.copy()
+    mac.update(SEGMENT_INFO.pack(number, final))
+    mac.update(encrypted)
+    return mac.digest()[:TAG_SIZE]
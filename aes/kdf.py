@@ -0,0 +1,153 @@
+""" Module with key derivation functions to get AES-128 key from master password. """
+import hashlib
+import os
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+from aes.transformations import R, NK, MIN_KEY_LENGTH
+
+PBKDF2 = 1
+SCRYPT = 2
+ALGORITHMS = ((SCRYPT,) if hasattr(hashlib, 'scrypt') else ()) + (PBKDF2,)
+DEFAULT_ALGORITHM = ALGORITHMS[0]
+
+KEY_SIZE = R * NK
+SALT_SIZE = 16
+SCRYPT_BLOCK_SIZE = 8
+SCRYPT_PARALLELISM = 1
+DEFAULT_TARGET_TIME = 0.5  # seconds of key derivation on unlock
+KEY_CACHE_SIZE = 8
+# limits of parameters read from files, they are checked before key derivation, because parameters are
+# authenticated only with derived key and changed file must not hang unlock or exhaust memory
+MIN_PBKDF2_COST = 1000
+MAX_PBKDF2_COST = 10 ** 7
+MIN_SCRYPT_COST = 10
+MAX_SCRYPT_COST = 20  # 2 ** 20 * 128 * SCRYPT_BLOCK_SIZE bytes = 1 GiB of memory
+
+# cost is number of iterations for PBKDF2 and log2 of N for scrypt,
+# block size and parallelism are scrypt r and p (zero for PBKDF2)
+KdfParameters = namedtuple('KdfParameters', 'algorithm salt cost block_size parallelism')
+
+
+def check_password(password):
+    """
+    Function to check password before key derivation, there is no upper limit of length.
+
+    :param password: master password
+    :type password: str
+    """
+    if len(password) < MIN_KEY_LENGTH:
+        raise ValueError('Password length is {}. Required length is at least {} symbols'.format(
+            len(password), MIN_KEY_LENGTH))
+
+
+def check_parameters(parameters):
+    """
+    Function to check KDF parameters read from file, ValueError is raised if they are out of limits.
+
+    :param parameters: KDF parameters
+    :type parameters: KdfParameters
+    """
+    algorithm, salt, cost, block_size, parallelism = parameters
+    if algorithm == PBKDF2:
+        valid = MIN_PBKDF2_COST <= cost <= MAX_PBKDF2_COST and block_size == 0 and parallelism == 0
+    elif algorithm == SCRYPT:
+        valid = MIN_SCRYPT_COST <= cost <= MAX_SCRYPT_COST and block_size == SCRYPT_BLOCK_SIZE and \
+            parallelism == SCRYPT_PARALLELISM
+    else:
+        raise ValueError('Unknown KDF algorithm {}.'.format(algorithm))
+    if not valid:
+        raise ValueError('Invalid KDF parameters: algorithm {}, cost {}, block size {}, parallelism {}.'.format(
+            algorithm, cost, block_size, parallelism))
+
+
+def new_parameters(algorithm=DEFAULT_ALGORITHM, cost=None):
+    """
+    Function to get parameters with new random salt.
+
+    :param algorithm: one of ALGORITHMS
+    :type algorithm: int
+    :param cost: cost of algorithm, calibrated for DEFAULT_TARGET_TIME if it is not set
+    :type cost: int
+    :return: KDF parameters
+    :rtype: KdfParameters
+    """
+    if algorithm not in ALGORITHMS:
+        raise ValueError('Unknown KDF algorithm {}.'.format(algorithm))
+    if cost is None:
+        cost = calibrate(algorithm)
+    if algorithm == SCRYPT:
+        return KdfParameters(algorithm, os.urandom(SALT_SIZE), cost, SCRYPT_BLOCK_SIZE, SCRYPT_PARALLELISM)
+    return KdfParameters(algorithm, os.urandom(SALT_SIZE), cost, 0, 0)
+
+
+@lru_cache(maxsize=KEY_CACHE_SIZE)
+def derive_key(password, parameters):
+    """
+    Function to derive AES key from password. The last KEY_CACHE_SIZE keys are cached,
+    so key is derived only once per unlock, however many times the database is read and written.
+
+    :param password: master password
+    :type password: str
+    :param parameters: KDF parameters
+    :type parameters: KdfParameters
+    :return: KEY_SIZE bytes key
+    :rtype: bytes
+    """
+    algorithm, salt, cost, block_size, parallelism = parameters
+    if algorithm == PBKDF2:
+        return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, cost, KEY_SIZE)
+    if algorithm == SCRYPT:
+        n = 1 << cost
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=block_size, p=parallelism,
+                              maxmem=2 * 128 * n * block_size * parallelism, dklen=KEY_SIZE)
+    raise ValueError('Unknown KDF algorithm {}.'.format(algorithm))
+
+
+def clear_key_cache():
+    """
+    Function to drop all cached derived keys from memory.
+    """
+    derive_key.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def calibrate(algorithm=DEFAULT_ALGORITHM, target_time=DEFAULT_TARGET_TIME):
+    """
+    Function to pick cost of algorithm, so key derivation takes about target_time on this machine.
+    Result is cached, calibration is done once per process.
+
+    :param algorithm: one of ALGORITHMS
+    :type algorithm: int
+    :param target_time: seconds of key derivation
+    :type target_time: float
+    :return: cost of algorithm
+    :rtype: int
+    """
+    if algorithm == PBKDF2:
+        iterations = 10000
+        elapsed = _measure(KdfParameters(PBKDF2, bytes(SALT_SIZE), iterations, 0, 0))
+        return min(MAX_PBKDF2_COST, max(iterations, int(iterations * target_time / elapsed)))
+
+    # scrypt time grows linearly with N, N is doubled while derivation is faster than target
+    cost = 10
+    elapsed = _measure(KdfParameters(SCRYPT, bytes(SALT_SIZE), cost, SCRYPT_BLOCK_SIZE, SCRYPT_PARALLELISM))
+    while elapsed * 2 <= target_time and cost < MAX_SCRYPT_COST:
+        cost += 1
+        elapsed *= 2
+    return cost
+
+
+def _measure(parameters):
+    """
+    Function to measure time of key derivation.
+
+    :param parameters: KDF parameters
+    :type parameters: KdfParameters
+    :return: seconds
+    :rtype: float
+    """
+    begin = time.perf_counter()
+    derive_key.__wrapped__('calibration', parameters)
+    return max(time.perf_counter() - begin, 1e-6)
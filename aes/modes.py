@@ -0,0 +1,246 @@
+""" Module with streaming AES-128 block cipher modes (CBC and CTR) over binary file-like objects. """
+from aes import aes, batch
+
+BLOCK_SIZE = batch.BLOCK_SIZE
+IV_SIZE = BLOCK_SIZE        # CBC initialization vector
+NONCE_SIZE = BLOCK_SIZE // 2  # CTR counter block = nonce + 64 bit big endian block counter
+COUNTER_SIZE = BLOCK_SIZE - NONCE_SIZE
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+
+def cbc_encrypt_stream(source, destination, key, iv, buffer_size=DEFAULT_BUFFER_SIZE):
+    """
+    Function to encrypt source stream to destination stream in CBC mode with PKCS#7 padding.
+    Only one buffer is held in memory.
+
+    :param source: binary file-like object to read plain data from
+    :param destination: binary file-like object to write encrypted data to
+    :param key: master password
+    :type key: str
+    :param iv: initialization vector, IV_SIZE random bytes
+    :type iv: bytes
+    :param buffer_size: bytes to read at once, multiple of BLOCK_SIZE
+    :type buffer_size: int
+    :return: number of written bytes
+    :rtype: int
+    """
+    _check_parameters(iv, IV_SIZE, buffer_size)
+    cipher = aes.get_cipher(key)
+
+    written = 0
+    previous = bytes(iv)
+    while True:
+        chunk = read_chunk(source, buffer_size)
+        last = len(chunk) < buffer_size
+        if last:
+            chunk = _pad(chunk)
+
+        # every block depends on previous one, so encryption is block by block
+        encrypted = bytearray()
+        for begin in range(0, len(chunk), BLOCK_SIZE):
+            previous = cipher.encrypt(xor_bytes(chunk[begin:begin + BLOCK_SIZE], previous))
+            encrypted.extend(previous)
+        destination.write(encrypted)
+        written += len(encrypted)
+
+        if last:
+            return written
+
+
+def cbc_decrypt_stream(source, destination, key, iv, buffer_size=DEFAULT_BUFFER_SIZE):
+    """
+    Function to decrypt source stream to destination stream in CBC mode with PKCS#7 padding.
+    Only one buffer is held in memory, blocks of one buffer are decrypted in one batch.
+
+    :param source: binary file-like object to read encrypted data from
+    :param destination: binary file-like object to write plain data to
+    :param key: master password
+    :type key: str
+    :param iv: initialization vector used for encryption
+    :type iv: bytes
+    :param buffer_size: bytes to read at once, multiple of BLOCK_SIZE
+    :type buffer_size: int
+    :return: number of written bytes
+    :rtype: int
+    """
+    _check_parameters(iv, IV_SIZE, buffer_size)
+
+    written = 0
+    previous = bytes(iv)
+    pending = b''  # last block is held back until padding can be removed
+    while True:
+        chunk = read_chunk(source, buffer_size)
+        if len(chunk) % BLOCK_SIZE != 0:
+            raise ValueError('Encrypted data length is not multiple of {}.'.format(BLOCK_SIZE))
+        if len(chunk) == 0:
+            break
+
+        decrypted = xor_bytes(batch.decrypt_blocks(chunk, key), previous + chunk[:-BLOCK_SIZE])
+        previous = chunk[-BLOCK_SIZE:]
+        destination.write(pending + decrypted[:-BLOCK_SIZE])
+        written += len(pending) + len(decrypted) - BLOCK_SIZE
+        pending = decrypted[-BLOCK_SIZE:]
+
+    if len(pending) == 0:
+        raise ValueError('Encrypted data is empty.')
+    pending = _unpad(pending)
+    destination.write(pending)
+    return written + len(pending)
+
+
+def ctr_crypt(data, key, nonce, offset=0):
+    """
+    Function to encrypt or decrypt data in CTR mode starting from any byte offset of the stream.
+
+    :param data: data to encrypt or decrypt
+    :type data: bytes
+    :param key: master password
+    :type key: str
+    :param nonce: NONCE_SIZE random bytes, never reused with the same key
+    :type nonce: bytes
+    :param offset: position of data in the stream
+    :type offset: int
+    :return: encrypted or decrypted data
+    :rtype: bytes
+    """
+    first_block, skip = divmod(offset, BLOCK_SIZE)
+    count = (skip + len(data) + BLOCK_SIZE - 1) // BLOCK_SIZE
+    stream = ctr_keystream(key, nonce, first_block, count)
+    return xor_bytes(data, stream[skip:skip + len(data)])
+
+
+def ctr_keystream(key, nonce, first_block, count):
+    """
+    Function to generate CTR key stream for range of blocks. All counter blocks are encrypted in one batch.
+
+    :param key: master password
+    :type key: str
+    :param nonce: NONCE_SIZE bytes
+    :type nonce: bytes
+    :param first_block: number of first block
+    :type first_block: int
+    :param count: number of blocks
+    :type count: int
+    :return: key stream, count * BLOCK_SIZE bytes
+    :rtype: bytes
+    """
+    if len(nonce) != NONCE_SIZE:
+        raise ValueError('Nonce length is {}. Required length is {}.'.format(len(nonce), NONCE_SIZE))
+    if first_block < 0 or first_block + count > 1 << (8 * COUNTER_SIZE):
+        raise ValueError('Block range {}-{} is out of counter range.'.format(first_block, first_block + count))
+
+    counters = b''.join(nonce + i.to_bytes(COUNTER_SIZE, 'big') for i in range(first_block, first_block + count))
+    return batch.encrypt_blocks(counters, key)
+
+
+def ctr_stream(source, destination, key, nonce, offset=0, buffer_size=DEFAULT_BUFFER_SIZE):
+    """
+    Function to encrypt or decrypt source stream to destination stream in CTR mode.
+    Only one buffer is held in memory.
+
+    :param source: binary file-like object to read data from
+    :param destination: binary file-like object to write result to
+    :param key: master password
+    :type key: str
+    :param nonce: NONCE_SIZE random bytes, never reused with the same key
+    :type nonce: bytes
+    :param offset: position of source data in the stream
+    :type offset: int
+    :param buffer_size: bytes to read at once, multiple of BLOCK_SIZE
+    :type buffer_size: int
+    :return: number of written bytes
+    :rtype: int
+    """
+    _check_parameters(nonce, NONCE_SIZE, buffer_size)
+
+    written = 0
+    while True:
+        chunk = read_chunk(source, buffer_size)
+        if len(chunk) == 0:
+            return written
+        destination.write(ctr_crypt(chunk, key, nonce, offset + written))
+        written += len(chunk)
+
+
+def xor_bytes(a, b):
+    """
+    Function to xor two byte strings of equal length.
+
+    :param a: first bytes
+    :type a: bytes
+    :param b: second bytes
+    :type b: bytes
+    :return: xor result
+    :rtype: bytes
+    """
+    return (int.from_bytes(a, 'big') ^ int.from_bytes(b, 'big')).to_bytes(len(a), 'big')
+
+
+def _check_parameters(iv, iv_size, buffer_size):
+    """
+    Function to check initialization vector (or nonce) and buffer size.
+
+    :param iv: initialization vector or nonce
+    :type iv: bytes
+    :param iv_size: required length
+    :type iv_size: int
+    :param buffer_size: bytes to read at once
+    :type buffer_size: int
+    """
+    if len(iv) != iv_size:
+        raise ValueError('IV length is {}. Required length is {}.'.format(len(iv), iv_size))
+    if buffer_size <= 0 or buffer_size % BLOCK_SIZE != 0:
+        raise ValueError('Buffer size is {}. Required size is multiple of {}.'.format(buffer_size, BLOCK_SIZE))
+
+
+def read_chunk(source, size):
+    """
+    Function to read exactly size bytes from source (less only at the end of stream).
+
+    :param source: binary file-like object
+    :param size: bytes to read
+    :type size: int
+    :return: read bytes
+    :rtype: bytes
+    """
+    chunk = source.read(size)
+    if len(chunk) in (0, size):
+        return chunk
+
+    parts = [chunk]
+    remaining = size - len(chunk)
+    while remaining > 0:
+        part = source.read(remaining)
+        if not part:
+            break
+        parts.append(part)
+        remaining -= len(part)
+    return b''.join(parts)
+
+
+def _pad(data):
+    """
+    Function to add PKCS#7 padding.
+
+    :param data: data to pad
+    :type data: bytes
+    :return: data with length multiple of BLOCK_SIZE
+    :rtype: bytes
+    """
+    length = BLOCK_SIZE - len(data) % BLOCK_SIZE
+    return data + bytes([length]) * length
+
+
+def _unpad(block):
+    """
+    Function to remove PKCS#7 padding from last block.
+
+    :param block: last decrypted block
+    :type block: bytes
+    :return: block without padding
+    :rtype: bytes
+    """
+    length = block[-1]
+    if not 0 < length <= BLOCK_SIZE or block[-length:] != bytes([length]) * length:
+        raise ValueError('Invalid padding.')
+    return block[:-length]
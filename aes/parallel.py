@@ -0,0 +1,107 @@
+""" Module with AES-128 CTR mode spread over process pool. """
+from concurrent.futures import ProcessPoolExecutor
+
+from aes import modes
+
+BLOCK_SIZE = modes.BLOCK_SIZE
+DEFAULT_CHUNK_SIZE = 256 * 1024  # bytes of key stream generated by one task
+DEFAULT_BUFFER_SIZE = 16 * 1024 * 1024
+
+
+def ctr_crypt_parallel(data, key, nonce, offset=0, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, executor=None):
+    """
+    Function to encrypt or decrypt data in CTR mode with key stream generated by pool of processes.
+    Key stream is split into ranges of chunk_size bytes, one range per task, so result is identical
+    to modes.ctr_crypt for any number of workers.
+
+    :param data: data to encrypt or decrypt
+    :type data: bytes
+    :param key: master password
+    :type key: str
+    :param nonce: modes.NONCE_SIZE random bytes, never reused with the same key
+    :type nonce: bytes
+    :param offset: position of data in the stream
+    :type offset: int
+    :param workers: number of processes, os.cpu_count() if None
+    :type workers: int
+    :param chunk_size: bytes of key stream per task, multiple of BLOCK_SIZE
+    :type chunk_size: int
+    :param executor: already running executor to use instead of new pool
+    :type executor: concurrent.futures.Executor
+    :return: encrypted or decrypted data
+    :rtype: bytes
+    """
+    if chunk_size <= 0 or chunk_size % BLOCK_SIZE != 0:
+        raise ValueError('Chunk size is {}. Required size is multiple of {}.'.format(chunk_size, BLOCK_SIZE))
+    if workers == 1 or len(data) <= chunk_size:
+        return modes.ctr_crypt(data, key, nonce, offset)
+
+    first_block, skip = divmod(offset, BLOCK_SIZE)
+    last_block = (offset + len(data) + BLOCK_SIZE - 1) // BLOCK_SIZE
+    chunk_blocks = chunk_size // BLOCK_SIZE
+    firsts = list(range(first_block, last_block, chunk_blocks))
+    counts = [min(chunk_blocks, last_block - first) for first in firsts]
+
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            streams = list(pool.map(_keystream_task, [key] * len(firsts), [nonce] * len(firsts), firsts, counts))
+    else:
+        streams = list(executor.map(_keystream_task, [key] * len(firsts), [nonce] * len(firsts), firsts, counts))
+
+    stream = b''.join(streams)
+    return modes.xor_bytes(data, stream[skip:skip + len(data)])
+
+
+def ctr_stream_parallel(source, destination, key, nonce, offset=0, workers=None,
+                        chunk_size=DEFAULT_CHUNK_SIZE, buffer_size=DEFAULT_BUFFER_SIZE):
+    """
+    Function to encrypt or decrypt source stream to destination stream in CTR mode with pool of processes.
+    One pool is used for the whole stream, only one buffer is held in memory.
+
+    :param source: binary file-like object to read data from
+    :param destination: binary file-like object to write result to
+    :param key: master password
+    :type key: str
+    :param nonce: modes.NONCE_SIZE random bytes, never reused with the same key
+    :type nonce: bytes
+    :param offset: position of source data in the stream
+    :type offset: int
+    :param workers: number of processes, os.cpu_count() if None
+    :type workers: int
+    :param chunk_size: bytes of key stream per task, multiple of BLOCK_SIZE
+    :type chunk_size: int
+    :param buffer_size: bytes to read at once, multiple of BLOCK_SIZE
+    :type buffer_size: int
+    :return: number of written bytes
+    :rtype: int
+    """
+    if buffer_size <= 0 or buffer_size % BLOCK_SIZE != 0:
+        raise ValueError('Buffer size is {}. Required size is multiple of {}.'.format(buffer_size, BLOCK_SIZE))
+
+    written = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            chunk = modes.read_chunk(source, buffer_size)
+            if len(chunk) == 0:
+                return written
+            destination.write(ctr_crypt_parallel(chunk, key, nonce, offset + written,
+                                                 workers=workers, chunk_size=chunk_size, executor=pool))
+            written += len(chunk)
+
+
+def _keystream_task(key, nonce, first_block, count):
+    """
+    Function to generate key stream for range of blocks in worker process.
+
+    :param key: master password
+    :type key: str
+    :param nonce: modes.NONCE_SIZE bytes
+    :type nonce: bytes
+    :param first_block: number of first block
+    :type first_block: int
+    :param count: number of blocks
+    :type count: int
+    :return: key stream
+    :rtype: bytes
+    """
+    return modes.ctr_keystream(key, nonce, first_block, count)
@@ -0,0 +1,222 @@
+""" Module with opt-in instrumentation of cipher and database stages: timings, blocks, bytes, peak memory. """
+import functools
+import threading
+import time
+import tracemalloc
+
+from aes import aes, batch, modes
+from aes import transformations
+
+# instrumented functions: owner (module or class), attribute name, stage name, counter function
+# counter function gets call arguments and result and returns number of blocks and bytes
+_INSTRUMENTED = []
+_current = None
+_originals = []
+_lock = threading.Lock()
+
+
+class Stats:
+    """
+    Stats class with collected statistics. Stage times include times of nested stages
+    (e.g. load time includes decryption time).
+    """
+    def __init__(self, trace_memory=False):
+        """
+        Stats initialization.
+
+        :param trace_memory: flag to trace peak memory allocation with tracemalloc
+        :type trace_memory: bool
+        """
+        self.stages = {}  # stage name <-> dict of calls, seconds, blocks, bytes
+        self.trace_memory = trace_memory
+        self.peak_memory = None
+
+    def add(self, stage, seconds, blocks=0, size=0):
+        """
+        Method to add one call of stage.
+
+        :param stage: stage name
+        :type stage: str
+        :param seconds: time of call
+        :type seconds: float
+        :param blocks: number of processed blocks
+        :type blocks: int
+        :param size: number of processed bytes
+        :type size: int
+        """
+        with _lock:
+            entry = self.stages.setdefault(stage, {'calls': 0, 'seconds': 0.0, 'blocks': 0, 'bytes': 0})
+            entry['calls'] += 1
+            entry['seconds'] += seconds
+            entry['blocks'] += blocks
+            entry['bytes'] += size
+
+    def update_peak_memory(self):
+        """
+        Method to read peak memory allocation since stats were enabled.
+        """
+        if self.trace_memory and tracemalloc.is_tracing():
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+
+    def as_dict(self):
+        """
+        Method to get stats as dict, e.g. to dump it as JSON.
+
+        :return: stats
+        :rtype: dict
+        """
+        self.update_peak_memory()
+        return {'stages': {stage: dict(entry) for stage, entry in self.stages.items()},
+                'peak_memory': self.peak_memory}
+
+    def summary(self):
+        """
+        Method to get one line summary of stages, the slowest stages first.
+
+        :return: summary
+        :rtype: str
+        """
+        self.update_peak_memory()
+        stages = sorted(self.stages.items(), key=lambda item: item[1]['seconds'], reverse=True)
+        parts = ['{} {:.3f} s'.format(stage, entry['seconds']) for stage, entry in stages]
+        if self.peak_memory is not None:
+            parts.append('peak memory {:.1f} MB'.format(self.peak_memory / 1e6))
+        return ', '.join(parts)
+
+    def log(self, logger):
+        """
+        Method to log every stage.
+
+        :param logger: logger
+        :type logger: logging.Logger
+        """
+        for stage, entry in self.as_dict()['stages'].items():
+            logger.info('%s: %d calls, %.6f s, %d blocks, %d bytes', stage, entry['calls'], entry['seconds'],
+                        entry['blocks'], entry['bytes'])
+        if self.peak_memory is not None:
+            logger.info('peak memory: %d bytes', self.peak_memory)
+
+
+def register(owner, name, stage, counter=None):
+    """
+    Function to register function for instrumentation. Function is replaced with measuring wrapper only
+    while stats are enabled, so there is no overhead when they are disabled.
+
+    :param owner: module or class of function
+    :param name: attribute name of function
+    :type name: str
+    :param stage: stage name
+    :type stage: str
+    :param counter: function to get number of processed blocks and bytes from arguments and result of call
+    :type counter: callable
+    """
+    _INSTRUMENTED.append((owner, name, stage, counter))
+    if _current is not None:
+        _install(owner, name, stage, counter)
+
+
+def enable(trace_memory=False):
+    """
+    Function to start collecting stats.
+
+    :param trace_memory: flag to trace peak memory allocation with tracemalloc (it slows down everything)
+    :type trace_memory: bool
+    :return: new stats
+    :rtype: Stats
+    """
+    global _current
+    if _current is not None:
+        disable()
+    _current = Stats(trace_memory)
+    for owner, name, stage, counter in _INSTRUMENTED:
+        _install(owner, name, stage, counter)
+    if trace_memory:
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+    return _current
+
+
+def disable():
+    """
+    Function to stop collecting stats and restore original functions.
+
+    :return: collected stats or None if stats were not enabled
+    :rtype: Stats
+    """
+    global _current
+    stats = _current
+    if stats is None:
+        return None
+    stats.update_peak_memory()
+    if stats.trace_memory:
+        tracemalloc.stop()
+    while _originals:
+        owner, name, function = _originals.pop()
+        setattr(owner, name, function)
+    _current = None
+    return stats
+
+
+def current():
+    """
+    Function to get stats being collected.
+
+    :return: current stats or None if stats are disabled
+    :rtype: Stats
+    """
+    return _current
+
+
+def _install(owner, name, stage, counter):
+    """
+    Function to replace function with measuring wrapper.
+
+    :param owner: module or class of function
+    :param name: attribute name of function
+    :type name: str
+    :param stage: stage name
+    :type stage: str
+    :param counter: function to get number of processed blocks and bytes
+    :type counter: callable
+    """
+    original = owner.__dict__[name] if isinstance(owner, type) else getattr(owner, name)
+    function = original.__func__ if isinstance(original, staticmethod) else original
+    stats = _current
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        begin = time.perf_counter()
+        result = function(*args, **kwargs)
+        seconds = time.perf_counter() - begin
+        blocks, size = counter(args, result) if counter is not None else (0, 0)
+        stats.add(stage, seconds, blocks, size)
+        return result
+
+    _originals.append((owner, name, original))
+    setattr(owner, name, staticmethod(wrapper) if isinstance(original, staticmethod) else wrapper)
+
+
+def count_blocks(position):
+    """
+    Function to get counter of blocks and bytes of data argument.
+
+    :param position: position of data argument
+    :type position: int
+    :return: counter function
+    :rtype: callable
+    """
+    def counter(args, result):
+        data = args[position]
+        size = data.nbytes if hasattr(data, 'nbytes') else len(data)
+        return size // batch.BLOCK_SIZE, size
+    return counter
+
+
+register(transformations, 'key_expansion', 'key expansion')
+register(aes.Cipher, 'encrypt', 'block encryption', count_blocks(1))
+register(aes.Cipher, 'decrypt', 'block decryption', count_blocks(1))
+register(batch, 'encrypt_blocks', 'batch encryption', count_blocks(0))
+register(batch, 'decrypt_blocks', 'batch decryption', count_blocks(0))
+register(modes, 'ctr_crypt', 'ctr', count_blocks(0))
+register(aes, 'message_to_bytes', 'message decoding', lambda args, result: (len(result), len(args[0])))
+register(aes, 'blocks_to_message', 'blocks to message', lambda args, result: (len(args[0]), len(result)))
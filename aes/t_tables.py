@@ -0,0 +1,132 @@
+""" Module with AES-128 round engine based on precomputed 32 bit T-tables. """
+from aes.tables import S_BOX_BYTES, REVERSE_S_BOX_BYTES
+from aes.transformations import R, NB, NR, GF_MUL
+
+# Each round works on four column words, row 0 is the most significant byte:
+#
+#   word = state[0][c] << 24 | state[1][c] << 16 | state[2][c] << 8 | state[3][c]
+#
+# TE0[x] is the column produced by SubBytes + MixColumns for byte x in row 0,
+# TE1..TE3 are the same column rotated for rows 1..3, so SubBytes, ShiftRows and
+# MixColumns of one round become 16 lookups and 16 xors.
+# TD0..TD3 do the same for InvSubBytes + InvMixColumns.
+
+
+def _word(a, b, c, d):
+    """
+    Function to pack four bytes of a column into one 32 bit word.
+    """
+    return a << 24 | b << 16 | c << 8 | d
+
+
+def _rotate(word, bits):
+    """
+    Function to rotate 32 bit word right by bits.
+    """
+    return (word >> bits | word << (32 - bits)) & 0xffffffff
+
+
+SBOX = list(S_BOX_BYTES)
+REVERSE_SBOX = list(REVERSE_S_BOX_BYTES)
+
+TE0 = [_word(GF_MUL[2][s], s, s, GF_MUL[3][s]) for s in SBOX]
+TE1 = [_rotate(word, 8) for word in TE0]
+TE2 = [_rotate(word, 16) for word in TE0]
+TE3 = [_rotate(word, 24) for word in TE0]
+
+TD0 = [_word(GF_MUL[14][s], GF_MUL[9][s], GF_MUL[13][s], GF_MUL[11][s]) for s in REVERSE_SBOX]
+TD1 = [_rotate(word, 8) for word in TD0]
+TD2 = [_rotate(word, 16) for word in TD0]
+TD3 = [_rotate(word, 24) for word in TD0]
+
+
+def get_round_words(key_schedule):
+    """
+    Function to convert key schedule from key_expansion to round key words.
+
+    :param key_schedule: round keys from key_expansion
+    :type key_schedule: list of lists
+    :return: encryption round words and decryption round words (equivalent inverse cipher)
+    :rtype: tuple
+    """
+    words = [_word(*(key_schedule[row][i] for row in range(R))) for i in range(NB * (NR + 1))]
+
+    # equivalent inverse cipher: reversed rounds, InvMixColumns applied to rounds 1..NR-1
+    reverse_words = []
+    for round_number in range(NR, -1, -1):
+        round_words = words[NB * round_number:NB * (round_number + 1)]
+        if 0 < round_number < NR:
+            round_words = [TD0[SBOX[w >> 24]] ^ TD1[SBOX[w >> 16 & 0xff]] ^
+                           TD2[SBOX[w >> 8 & 0xff]] ^ TD3[SBOX[w & 0xff]] for w in round_words]
+        reverse_words.extend(round_words)
+    return words, reverse_words
+
+
+def encrypt_block(data, words):
+    """
+    Function to encrypt one block.
+
+    :param data: data to encrypt (16 ints, column by column)
+    :type data: list of ints or bytes
+    :param words: encryption round words from get_round_words
+    :type words: list of ints
+    :return: encrypted data
+    :rtype: bytes
+    """
+    te0, te1, te2, te3, sbox = TE0, TE1, TE2, TE3, SBOX
+
+    s0 = (data[0] << 24 | data[1] << 16 | data[2] << 8 | data[3]) ^ words[0]
+    s1 = (data[4] << 24 | data[5] << 16 | data[6] << 8 | data[7]) ^ words[1]
+    s2 = (data[8] << 24 | data[9] << 16 | data[10] << 8 | data[11]) ^ words[2]
+    s3 = (data[12] << 24 | data[13] << 16 | data[14] << 8 | data[15]) ^ words[3]
+
+    k = 4
+    for _ in range(1, NR):  # NR-1 rounds
+        t0 = te0[s0 >> 24] ^ te1[s1 >> 16 & 0xff] ^ te2[s2 >> 8 & 0xff] ^ te3[s3 & 0xff] ^ words[k]
+        t1 = te0[s1 >> 24] ^ te1[s2 >> 16 & 0xff] ^ te2[s3 >> 8 & 0xff] ^ te3[s0 & 0xff] ^ words[k + 1]
+        t2 = te0[s2 >> 24] ^ te1[s3 >> 16 & 0xff] ^ te2[s0 >> 8 & 0xff] ^ te3[s1 & 0xff] ^ words[k + 2]
+        t3 = te0[s3 >> 24] ^ te1[s0 >> 16 & 0xff] ^ te2[s1 >> 8 & 0xff] ^ te3[s2 & 0xff] ^ words[k + 3]
+        s0, s1, s2, s3 = t0, t1, t2, t3
+        k += 4
+
+    # last round: SubBytes and ShiftRows only
+    t0 = _word(sbox[s0 >> 24], sbox[s1 >> 16 & 0xff], sbox[s2 >> 8 & 0xff], sbox[s3 & 0xff]) ^ words[k]
+    t1 = _word(sbox[s1 >> 24], sbox[s2 >> 16 & 0xff], sbox[s3 >> 8 & 0xff], sbox[s0 & 0xff]) ^ words[k + 1]
+    t2 = _word(sbox[s2 >> 24], sbox[s3 >> 16 & 0xff], sbox[s0 >> 8 & 0xff], sbox[s1 & 0xff]) ^ words[k + 2]
+    t3 = _word(sbox[s3 >> 24], sbox[s0 >> 16 & 0xff], sbox[s1 >> 8 & 0xff], sbox[s2 & 0xff]) ^ words[k + 3]
+    return (t0 << 96 | t1 << 64 | t2 << 32 | t3).to_bytes(16, 'big')
+
+
+def decrypt_block(data, words):
+    """
+    Function to decrypt one block.
+
+    :param data: data to decrypt (16 ints, column by column)
+    :type data: list of ints or bytes
+    :param words: decryption round words from get_round_words
+    :type words: list of ints
+    :return: decrypted data
+    :rtype: bytes
+    """
+    td0, td1, td2, td3, sbox = TD0, TD1, TD2, TD3, REVERSE_SBOX
+
+    s0 = (data[0] << 24 | data[1] << 16 | data[2] << 8 | data[3]) ^ words[0]
+    s1 = (data[4] << 24 | data[5] << 16 | data[6] << 8 | data[7]) ^ words[1]
+    s2 = (data[8] << 24 | data[9] << 16 | data[10] << 8 | data[11]) ^ words[2]
+    s3 = (data[12] << 24 | data[13] << 16 | data[14] << 8 | data[15]) ^ words[3]
+
+    k = 4
+    for _ in range(1, NR):
+        t0 = td0[s0 >> 24] ^ td1[s3 >> 16 & 0xff] ^ td2[s2 >> 8 & 0xff] ^ td3[s1 & 0xff] ^ words[k]
+        t1 = td0[s1 >> 24] ^ td1[s0 >> 16 & 0xff] ^ td2[s3 >> 8 & 0xff] ^ td3[s2 & 0xff] ^ words[k + 1]
+        t2 = td0[s2 >> 24] ^ td1[s1 >> 16 & 0xff] ^ td2[s0 >> 8 & 0xff] ^ td3[s3 & 0xff] ^ words[k + 2]
+        t3 = td0[s3 >> 24] ^ td1[s2 >> 16 & 0xff] ^ td2[s1 >> 8 & 0xff] ^ td3[s0 & 0xff] ^ words[k + 3]
+        s0, s1, s2, s3 = t0, t1, t2, t3
+        k += 4
+
+    # last round: InvShiftRows and InvSubBytes only
+    t0 = _word(sbox[s0 >> 24], sbox[s3 >> 16 & 0xff], sbox[s2 >> 8 & 0xff], sbox[s1 & 0xff]) ^ words[k]
+    t1 = _word(sbox[s1 >> 24], sbox[s0 >> 16 & 0xff], sbox[s3 >> 8 & 0xff], sbox[s2 & 0xff]) ^ words[k + 1]
+    t2 = _word(sbox[s2 >> 24], sbox[s1 >> 16 & 0xff], sbox[s0 >> 8 & 0xff], sbox[s3 & 0xff]) ^ words[k + 2]
+    t3 = _word(sbox[s3 >> 24], sbox[s2 >> 16 & 0xff], sbox[s1 >> 8 & 0xff], sbox[s0 & 0xff]) ^ words[k + 3]
+    return (t0 << 96 | t1 << 64 | t2 << 32 | t3).to_bytes(16, 'big')
@@ -38,6 +38,11 @@ REVERSE_S_BOX = [
     [0x17, 0x2b, 0x04, 0x7e, 0xba, 0x77, 0xd6, 0x26, 0xe1, 0x69, 0x14, 0x63, 0x55, 0x21, 0x0c, 0x7d],
 ]
 
+# flat 256 byte S-boxes: S_BOX_BYTES[x] == S_BOX[x // 0x10][x % 0x10],
+# can be used with bytes.translate to substitute whole buffer at once
+S_BOX_BYTES = bytes(item for row in S_BOX for item in row)
+REVERSE_S_BOX_BYTES = bytes(item for row in REVERSE_S_BOX for item in row)
+
 GF_MATRIX = [
     [0x02, 0x03, 0x01, 0x01],
     [0x01, 0x02, 0x03, 0x01],
@@ -1,6 +1,6 @@
 """ Module with all AES-128 states transformations. """
 import string
-from aes.tables import S_BOX, REVERSE_S_BOX, GF_MATRIX, REVERSE_GF_MATRIX, RCON
+from aes.tables import S_BOX_BYTES, REVERSE_S_BOX_BYTES, GF_MATRIX, REVERSE_GF_MATRIX, RCON
 
 # state = [[], [], [], []]
 #
@@ -11,6 +11,13 @@ from aes.tables import S_BOX, REVERSE_S_BOX, GF_MATRIX, REVERSE_GF_MATRIX, RCON
 #          [a4, b4, c4, d4]]  | 4 = rows number (R)
 # https://en.wikipedia.org/wiki/Advanced_Encryption_Standard
 # https://habr.com/post/212235/
+#
+# flat state = bytearray(16), column by column (same order as data block):
+#
+#   [a1, a2, a3, a4, b1, b2, b3, b4, c1, c2, c3, c4, d1, d2, d3, d4]
+#
+# state[row][column] == flat_state[row + R * column]
+# *_flat functions modify flat state in place and do not allocate lists.
 
 R = 4    # rows number
 
@@ -34,13 +41,10 @@ def sub_bytes(state, reverse=False):
     :type reverse: bool
     :return: modified data block
     """
-    table = S_BOX if not reverse else REVERSE_S_BOX
+    table = S_BOX_BYTES if not reverse else REVERSE_S_BOX_BYTES
 
     for i in range(R):
-        for j in range(NB):
-            row = state[i][j] // 0x10
-            column = state[i][j] % 0x10
-            state[i][j] = table[row][column]
+        state[i] = list(bytes(state[i]).translate(table))
     return state
 
 
@@ -84,25 +88,28 @@ def gf256_mul(a, b):
     return result
 
 
+# GF_MUL[factor][x] == gf256_mul(x, factor) for every factor of GF_MATRIX and REVERSE_GF_MATRIX
+GF_MUL = {factor: [gf256_mul(x, factor) for x in range(0x100)]
+          for factor in sorted({factor for row in GF_MATRIX + REVERSE_GF_MATRIX for factor in row})}
+
+MIX_COLUMNS_TABLES = [[GF_MUL[factor] for factor in row] for row in GF_MATRIX]
+REVERSE_MIX_COLUMNS_TABLES = [[GF_MUL[factor] for factor in row] for row in REVERSE_GF_MATRIX]
+
+
 def mix_columns(state, reverse=False):
     """
     Mix columns function. Transformation in GF(256) Galua filed.
+    Multiplications are looked up in GF_MUL tables instead of computed with gf256_mul.
 
     :param state: data block to modify
     :param reverse: direction of transformation
     :return: result of transformation for state
     """
-    mul = gf256_mul
-    matrix = GF_MATRIX if not reverse else REVERSE_GF_MATRIX
+    tables = MIX_COLUMNS_TABLES if not reverse else REVERSE_MIX_COLUMNS_TABLES
+    row_0, row_1, row_2, row_3 = state
     for i in range(NB):
-        column = []
-        for row in matrix:
-            cell = mul(row[0], state[0][i])
-            for j in range(1, len(row)):
-                cell ^= mul(row[j], state[j][i])
-            column.append(cell)
-        for j in range(len(column)):
-            state[j][i] = column[j]
+        a0, a1, a2, a3 = row_0[i], row_1[i], row_2[i], row_3[i]
+        row_0[i], row_1[i], row_2[i], row_3[i] = [m0[a0] ^ m1[a1] ^ m2[a2] ^ m3[a3] for m0, m1, m2, m3 in tables]
     return state
 
 
@@ -123,17 +130,22 @@ def key_expansion(key):
     """
     Generation of round keys.
 
-    :param key: master password
-    :type key: str
+    :param key: master password or raw key of R * NK bytes (e.g. derived from password by KDF)
+    :type key: str or bytes
     :return: key schedule - round keys
     """
-    apply_key_constraints(key)
-    if any(symbol not in VALID_SYMBOLS for symbol in key):
-        raise Exception('Key includes invalid symbols.')
+    if isinstance(key, bytes):
+        if len(key) != R * NK:
+            raise ValueError('Raw key length is {}. Required length is {} bytes'.format(len(key), R * NK))
+        key_symbols = list(key)
+    else:
+        apply_key_constraints(key)
+        if any(symbol not in VALID_SYMBOLS for symbol in key):
+            raise Exception('Key includes invalid symbols.')
 
-    if len(key) < R * NK:
-        key += chr(EMPTY_SYMBOL_CODE) * (R * NK - len(key))
-    key_symbols = [ord(symbol) for symbol in key]
+        if len(key) < R * NK:
+            key += chr(EMPTY_SYMBOL_CODE) * (R * NK - len(key))
+        key_symbols = [ord(symbol) for symbol in key]
 
     key_schedule = [[] for i in range(R)]
     for row in range(R):
@@ -147,10 +159,7 @@ def key_expansion(key):
             column = [key_schedule[row][i - 1] for row in range(R)]
             column = column[1:] + column[:1]
             # replace elements according S_BOX
-            for j in range(len(column)):
-                row = column[j] // 0x10
-                col = column[j] % 0x10
-                column[j] = S_BOX[row][col]
+            column = bytes(column).translate(S_BOX_BYTES)
             for row in range(R):
                 a = key_schedule[row][i - NK]
                 b = column[row]
@@ -177,3 +186,79 @@ def add_round_key(state, key_schedule, round_number=0):
         for j in range(R):
             state[j][i] ^= key_schedule[j][NB * round_number + i]
     return state
+
+
+def sub_bytes_flat(state, reverse=False):
+    """
+    SubBytes step for flat state, modifies state in place.
+    Whole state is substituted by one bytes.translate call, so state may also be a buffer of many blocks.
+
+    :param state: data block (or blocks) to modify
+    :type state: bytearray
+    :param reverse: direction of transformation
+    :type reverse: bool
+    """
+    state[:] = state.translate(S_BOX_BYTES if not reverse else REVERSE_S_BOX_BYTES)
+
+
+def shift_rows_flat(state, reverse=False):
+    """
+    ShiftRows step for flat state, modifies state in place.
+
+    :param state: data block to modify
+    :type state: bytearray
+    :param reverse: direction of transformation
+    :type reverse: bool
+    """
+    if not reverse:  # left shift
+        state[1], state[5], state[9], state[13] = state[5], state[9], state[13], state[1]
+        state[3], state[7], state[11], state[15] = state[15], state[3], state[7], state[11]
+    else:  # right shift
+        state[1], state[5], state[9], state[13] = state[13], state[1], state[5], state[9]
+        state[3], state[7], state[11], state[15] = state[7], state[11], state[15], state[3]
+    state[2], state[6], state[10], state[14] = state[10], state[14], state[2], state[6]
+
+
+def mix_columns_flat(state, reverse=False):
+    """
+    MixColumns step for flat state, modifies state in place.
+
+    :param state: data block to modify
+    :type state: bytearray
+    :param reverse: direction of transformation
+    :type reverse: bool
+    """
+    (m00, m01, m02, m03), (m10, m11, m12, m13), (m20, m21, m22, m23), (m30, m31, m32, m33) = \
+        MIX_COLUMNS_TABLES if not reverse else REVERSE_MIX_COLUMNS_TABLES
+    for i in range(0, R * NB, R):
+        a0, a1, a2, a3 = state[i], state[i + 1], state[i + 2], state[i + 3]
+        state[i] = m00[a0] ^ m01[a1] ^ m02[a2] ^ m03[a3]
+        state[i + 1] = m10[a0] ^ m11[a1] ^ m12[a2] ^ m13[a3]
+        state[i + 2] = m20[a0] ^ m21[a1] ^ m22[a2] ^ m23[a3]
+        state[i + 3] = m30[a0] ^ m31[a1] ^ m32[a2] ^ m33[a3]
+
+
+def add_round_key_flat(state, round_key):
+    """
+    AddRoundKey step for flat state, modifies state in place.
+
+    :param state: data block to modify
+    :type state: bytearray
+    :param round_key: round key in flat state order
+    :type round_key: bytes
+    """
+    for i in range(R * NB):
+        state[i] ^= round_key[i]
+
+
+def get_round_key_flat(key_schedule, round_number):
+    """
+    Function to cut one round key out of key schedule in flat state order.
+
+    :param key_schedule: round keys from key_expansion
+    :param round_number: number of round
+    :return: round key
+    :rtype: bytes
+    """
+    begin = NB * round_number
+    return bytes(key_schedule[row][begin + column] for column in range(NB) for row in range(R))
@@ -0,0 +1,275 @@
+""" Module with AES-128 and password database benchmarks, results are printed as JSON to compare commits. """
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from timeit import repeat, timeit
+
+import aes.transformations as aes
+from aes import aes as cipher, batch, kdf
+from controller.passwords_file import PasswordsFile, Record
+
+# FIPS-197 known answers: key, plain block, encrypted block (appendix B and appendix C.1)
+KNOWN_ANSWERS = (
+    ('2b7e151628aed2a6abf7158809cf4f3c', '3243f6a8885a308d313198a2e0370734', '3925841d02dc09fbdc118597196a0b32'),
+    ('000102030405060708090a0b0c0d0e0f', '00112233445566778899aabbccddeeff', '69c4e0d86a7b0430d8cdb78070b4c55a'),
+)
+BULK_SIZE = 1024 * 1024
+SLOW_BULK_SIZE = 64 * 1024  # for engines which process buffer block by block
+RECORD_COUNTS = (1000, 10000, 100000)
+REPEAT = 3
+PASSWORD = 'benchmark password'
+# cheap fixed KDF, so database timings do not depend on calibration
+KDF_PARAMETERS = kdf.KdfParameters(kdf.PBKDF2, bytes(kdf.SALT_SIZE), 1000, 0, 0)
+
+
+def mix_columns_gf256_mul(state, reverse=False):
+    """
+    Mix columns computed with gf256_mul for every multiplication (implementation before GF_MUL tables).
+
+    :param state: data block to modify
+    :param reverse: direction of transformation
+    :return: result of transformation for state
+    """
+    mul = aes.gf256_mul
+    matrix = aes.GF_MATRIX if not reverse else aes.REVERSE_GF_MATRIX
+    for i in range(aes.NB):
+        column = []
+        for row in matrix:
+            cell = mul(row[0], state[0][i])
+            for j in range(1, len(row)):
+                cell ^= mul(row[j], state[j][i])
+            column.append(cell)
+        for j in range(len(column)):
+            state[j][i] = column[j]
+    return state
+
+
+def bench_mix_columns(number=20000):
+    """
+    Function to compare mix columns with gf256_mul and with GF_MUL tables.
+
+    :param number: number of calls for each implementation
+    :type number: int
+    :return: seconds per call: transformation <-> implementation <-> time
+    :rtype: dict
+    """
+    state = [[(row * aes.NB + column) * 17 % 0x100 for column in range(aes.NB)] for row in range(aes.R)]
+    results = {}
+    for reverse in (False, True):
+        expected = mix_columns_gf256_mul([row[:] for row in state], reverse)
+        assert aes.mix_columns([row[:] for row in state], reverse) == expected
+
+        loop = timeit(lambda: mix_columns_gf256_mul(state, reverse), number=number)
+        table = timeit(lambda: aes.mix_columns(state, reverse), number=number)
+        results['inv_mix_columns' if reverse else 'mix_columns'] = {
+            'gf256_mul': loop / number,
+            'gf_mul_tables': table / number,
+        }
+    return results
+
+
+def check_known_answers(engines):
+    """
+    Function to check all engines with FIPS-197 known answers, timings are not valid if any check fails.
+
+    :param engines: batch engines to check
+    :type engines: iterable of str
+    """
+    for key, plain, encrypted in KNOWN_ANSWERS:
+        key, plain, encrypted = bytes.fromhex(key), bytes.fromhex(plain), bytes.fromhex(encrypted)
+        for engine in cipher.ENGINES:
+            block_cipher = cipher.Cipher(key, engine)
+            if block_cipher.encrypt(plain) != encrypted or block_cipher.decrypt(encrypted) != plain:
+                raise AssertionError('engine "{}" failed FIPS-197 known answer test'.format(engine))
+        for engine in engines:
+            if batch.encrypt_blocks(plain * 3, key, engine) != encrypted * 3 or \
+                    batch.decrypt_blocks(encrypted * 3, key, engine) != plain * 3:
+                raise AssertionError('batch engine "{}" failed FIPS-197 known answer test'.format(engine))
+
+
+def bench_block_latency(number=2000):
+    """
+    Function to measure encryption and decryption of one block by every cipher engine.
+
+    :param number: number of blocks
+    :type number: int
+    :return: seconds per block: engine <-> direction <-> time
+    :rtype: dict
+    """
+    block = bytes(range(batch.BLOCK_SIZE))
+    results = {}
+    for engine in cipher.ENGINES:
+        block_cipher = cipher.Cipher(PASSWORD[:aes.MAX_KEY_LENGTH], engine)
+        results[engine] = {
+            'encrypt': min(repeat(lambda: block_cipher.encrypt(block), number=number, repeat=REPEAT)) / number,
+            'decrypt': min(repeat(lambda: block_cipher.decrypt(block), number=number, repeat=REPEAT)) / number,
+        }
+    return results
+
+
+def bench_bulk(engines):
+    """
+    Function to measure throughput of batch engines.
+
+    :param engines: batch engines to measure
+    :type engines: iterable of str
+    :return: MB/s: engine <-> direction <-> throughput
+    :rtype: dict
+    """
+    results = {}
+    for engine in engines:
+        size = SLOW_BULK_SIZE if engine in cipher.ENGINES else BULK_SIZE
+        data = random.Random(size).randbytes(size)
+        key = PASSWORD[:aes.MAX_KEY_LENGTH]
+        results[engine] = {
+            direction: size / 1e6 / min(repeat(lambda: function(data, key, engine), number=1, repeat=REPEAT))
+            for direction, function in (('encrypt', batch.encrypt_blocks), ('decrypt', batch.decrypt_blocks))
+        }
+    return results
+
+
+def bench_key_expansion(number=2000):
+    """
+    Function to measure key expansion of password and of raw key.
+
+    :param number: number of expansions
+    :type number: int
+    :return: seconds per expansion: key type <-> time
+    :rtype: dict
+    """
+    password, raw_key = PASSWORD[:aes.MAX_KEY_LENGTH], bytes(range(aes.R * aes.NK))
+    return {
+        'password': min(repeat(lambda: aes.key_expansion(password), number=number, repeat=REPEAT)) / number,
+        'raw_key': min(repeat(lambda: aes.key_expansion(raw_key), number=number, repeat=REPEAT)) / number,
+    }
+
+
+def bench_passwords_file(record_counts=RECORD_COUNTS):
+    """
+    Function to measure saving and loading of synthetic databases.
+
+    :param record_counts: numbers of records in databases
+    :type record_counts: iterable of int
+    :return: seconds: record count <-> operation <-> time
+    :rtype: dict
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for count in record_counts:
+            generator = random.Random(count)
+            records = [Record('title {}'.format(i), 'user{}'.format(generator.randrange(count)),
+                              generator.randbytes(12).hex(), 'https://example.com/{}'.format(i))
+                       for i in range(count)]
+            database = PasswordsFile(PASSWORD, 'benchmark{}'.format(count), directory + os.sep, backups=0)
+            database.kdf_parameters = KDF_PARAMETERS
+
+            def open_records():
+                database.open_records().close()
+
+            results[str(count)] = {
+                'save_data': min(repeat(lambda: database.save_data(records), number=1, repeat=REPEAT)),
+                'load_data': min(repeat(database.load_data, number=1, repeat=REPEAT)),
+                'open_records': min(repeat(open_records, number=1, repeat=REPEAT)),
+            }
+    return results
+
+
+def bench_startup():
+    """
+    Function to measure start of new interpreter which imports command-line interface and GUI window modules.
+    GUI is skipped when PyQt5 is not installed.
+
+    :return: seconds: interface <-> time
+    :rtype: dict
+    """
+    def start(module):
+        times = []
+        for _ in range(REPEAT):
+            begin = time.perf_counter()
+            subprocess.run([sys.executable, '-c', 'import ' + module], check=True,
+                           cwd=os.path.dirname(os.path.abspath(__file__)))
+            times.append(time.perf_counter() - begin)
+        return min(times)
+
+    results = {'python': start('sys'), 'cli': start('cli')}
+    if importlib.util.find_spec('PyQt5') is not None:
+        results['gui'] = start('controller.password_manager')
+    return results
+
+
+def compare(old, new, threshold=0.1, path=''):
+    """
+    Function to print results which differ more than threshold from old results.
+    Times are better when they are lower, throughputs (MB/s) when they are higher.
+
+    :param old: old results
+    :type old: dict
+    :param new: new results
+    :type new: dict
+    :param threshold: relative difference to print
+    :type threshold: float
+    :param path: path of results in whole results
+    :type path: str
+    """
+    for name, value in new.items():
+        if name not in old:
+            continue
+        if isinstance(value, dict):
+            compare(old[name], value, threshold, path + name + '/')
+        elif isinstance(value, float) and old[name]:
+            ratio = value / old[name]
+            if abs(ratio - 1) > threshold:
+                print('{}{}: {:.4g} -> {:.4g} ({:+.0%})'.format(path, name, old[name], value, ratio - 1))
+
+
+def run(engines=batch.BATCH_ENGINES, record_counts=RECORD_COUNTS):
+    """
+    Function to run all benchmarks.
+
+    :param engines: batch engines to measure
+    :type engines: iterable of str
+    :param record_counts: numbers of records in benchmark databases
+    :type record_counts: iterable of int
+    :return: results of all benchmarks
+    :rtype: dict
+    """
+    check_known_answers(engines)
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'known_answers': 'ok',
+        'mix_columns': bench_mix_columns(),
+        'block_latency': bench_block_latency(),
+        'bulk_mb_s': bench_bulk(engines),
+        'key_expansion': bench_key_expansion(),
+        'passwords_file': bench_passwords_file(record_counts),
+        'startup': bench_startup(),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--engines', nargs='+', choices=batch.BATCH_ENGINES, default=batch.BATCH_ENGINES)
+    parser.add_argument('--records', nargs='*', type=int, default=RECORD_COUNTS,
+                        help='numbers of records in benchmark databases')
+    parser.add_argument('--output', help='file to write JSON results to')
+    parser.add_argument('--compare', help='JSON results of previous run to compare with')
+    args = parser.parse_args()
+
+    results = run(args.engines, args.records)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
@@ -0,0 +1,28 @@
+""" Module to compile QT Designer files of view to Python modules, they are loaded faster than parsed .ui files. """
+import glob
+import os
+
+from PyQt5 import uic
+
+
+def build(directory='./view/'):
+    """
+    Function to compile every UI file of directory to module with _ui suffix (main_window.ui -> main_window_ui.py).
+
+    :param directory: directory with UI files
+    :type directory: str
+    :return: paths of compiled modules
+    :rtype: list
+    """
+    modules = []
+    for ui_file in sorted(glob.glob(os.path.join(directory, '*.ui'))):
+        module = ui_file[:-len('.ui')] + '_ui.py'
+        with open(module, 'w') as f:
+            uic.compileUi(ui_file, f)
+        modules.append(module)
+    return modules
+
+
+if __name__ == '__main__':
+    for path in build():
+        print(path)
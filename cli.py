@@ -0,0 +1,208 @@
+""" Command-line interface to work with password databases without QT. """
+import json
+import os
+
+import click
+
+from controller import importer
+from controller.passwords_file import PasswordsFile, Record
+
+FIELDS = ('title', 'username', 'password', 'destination')
+
+
+def open_database(context, name):
+    """
+    Function to open database and check its password, only vault header is read.
+
+    :param context: click context with database directory and password
+    :type context: click.Context
+    :param name: database name
+    :type name: str
+    :return: database file
+    :rtype: PasswordsFile
+    """
+    try:
+        database = PasswordsFile(context.obj['password'], file_name=name, pwd=context.obj['pwd'],
+                                 backups=context.obj['backups'])
+        database.check_password()
+    except (ValueError, PermissionError) as error:
+        raise click.ClickException('{}: {}'.format(name, error))
+    return database
+
+
+def record_to_dict(record, with_password=True):
+    """
+    Function to convert record to dict for JSON output.
+
+    :param record: record
+    :type record: Record
+    :param with_password: flag to include password
+    :type with_password: bool
+    :return: record fields
+    :rtype: dict
+    """
+    return {field: getattr(record, field) for field in FIELDS if with_password or field != 'password'}
+
+
+def record_from_dict(item):
+    """
+    Function to convert dict from JSON input to record.
+
+    :param item: record fields
+    :type item: dict
+    :return: record
+    :rtype: Record
+    """
+    try:
+        return Record(*(item[field] for field in FIELDS))
+    except (KeyError, TypeError, ValueError) as error:
+        raise click.ClickException('invalid record {!r}: {}'.format(item, error))
+
+
+def find_record(records, index, title):
+    """
+    Function to find record by index or by title.
+
+    :param records: records of database
+    :type records: sequence of Record
+    :param index: record number
+    :type index: int
+    :param title: record title, used if index is None
+    :type title: str
+    :return: record number
+    :rtype: int
+    """
+    if index is None and title is None:
+        raise click.UsageError('record index or --title is required')
+    if index is None:
+        for i, record in enumerate(records):
+            if record.title == title:
+                return i
+        raise click.ClickException('record "{}" is not found'.format(title))
+    if not 0 <= index < len(records):
+        raise click.ClickException('record index {} is out of range'.format(index))
+    return index
+
+
+@click.group()
+@click.option('--pwd', default='./db/', show_default=True, help='directory of databases')
+@click.option('--password', envvar='PASSWORD_MANAGER_PASSWORD', prompt=True, hide_input=True,
+              help='master password, also read from PASSWORD_MANAGER_PASSWORD')
+@click.option('--backups', default=PasswordsFile.DEFAULT_BACKUPS, show_default=True,
+              help='number of rotating backups kept on save')
+@click.pass_context
+def cli(context, pwd, password, backups):
+    """ Password manager command-line interface. """
+    context.obj = {'pwd': pwd if pwd.endswith('/') else pwd + '/', 'password': password, 'backups': backups}
+
+
+@cli.command('list')
+@click.argument('names', nargs=-1, required=True)
+@click.pass_context
+def list_records(context, names):
+    """ List records of databases without passwords. """
+    for name in names:
+        for i, record in enumerate(open_database(context, name).load_data()):
+            click.echo('\t'.join(([name] if len(names) > 1 else []) +
+                                 [str(i), record.title, record.username, record.destination]))
+
+
+@cli.command()
+@click.argument('name')
+@click.argument('index', type=int, required=False)
+@click.option('--title', help='find record by title instead of index')
+@click.pass_context
+def get(context, name, index, title):
+    """ Print password of record. """
+    database = open_database(context, name)
+    if index is None:
+        # search by title reads every record, chunks are decrypted faster than single records
+        records = database.load_data()
+        click.echo(records[find_record(records, index, title)].password)
+        return
+    # only one record is decrypted
+    records = database.open_records()
+    try:
+        click.echo(records[find_record(records, index, title)].password)
+    finally:
+        if hasattr(records, 'close'):
+            records.close()
+
+
+@cli.command()
+@click.argument('name')
+@click.argument('title')
+@click.argument('username')
+@click.argument('destination')
+@click.option('--record-password', prompt=True, hide_input=True, confirmation_prompt=True,
+              help='password of new record')
+@click.pass_context
+def add(context, name, title, username, destination, record_password):
+    """ Add record to database journal. """
+    database = open_database(context, name)
+    database.add_record(record_from_dict({'title': title, 'username': username, 'password': record_password,
+                                          'destination': destination}))
+    if database.needs_compaction():
+        database.save_data(database.load_data())
+
+
+@cli.command()
+@click.argument('name')
+@click.argument('index', type=int, required=False)
+@click.option('--title', help='find record by title instead of index')
+@click.pass_context
+def delete(context, name, index, title):
+    """ Delete record from database. """
+    database = open_database(context, name)
+    records = database.load_data()
+    database.delete_record(find_record(records, index, title))
+    if database.needs_compaction():
+        database.save_data(database.load_data())
+
+
+@cli.command('import')
+@click.argument('name')
+@click.argument('source', type=click.File('rb'), default='-')
+@click.option('--format', 'file_format', type=click.Choice(importer.FORMATS),
+              help='format of source, it is found by file extension by default')
+@click.option('--skip-invalid', is_flag=True, help='skip records with empty fields instead of stopping')
+@click.pass_context
+def import_records(context, name, source, file_format, skip_invalid):
+    """ Append records from CSV or JSON export (standard input by default), database is written once. """
+    if file_format is None:
+        if source.name == '-' or not isinstance(source.name, str):
+            raise click.UsageError('--format is required to import from standard input')
+        try:
+            file_format = importer.get_format(source.name)
+        except ValueError as error:
+            raise click.UsageError(str(error))
+    errors = [] if skip_invalid else None
+    database = open_database(context, name)
+    size = os.fstat(source.fileno()).st_size if source.seekable() else 0
+    try:
+        # progress of read bytes is shown for files, size of standard input is unknown
+        with click.progressbar(length=size, label='importing', file=click.get_text_stream('stderr')) as bar:
+            count = importer.import_file(database, source, file_format,
+                                         (lambda done, total: bar.update(done - bar.pos)) if size else None, errors)
+    except ValueError as error:  # invalid record or export, database is not changed
+        raise click.ClickException(str(error))
+    for message in errors or []:
+        click.echo('skipped {}'.format(message), err=True)
+    click.echo('{}: imported {} records'.format(name, count), err=True)
+
+
+@cli.command()
+@click.argument('names', nargs=-1, required=True)
+@click.option('--output', type=click.File('w'), default='-', help='file to write JSON to')
+@click.pass_context
+def export(context, names, output):
+    """ Export records as JSON list, or as object of lists if several databases are exported. """
+    exported = {}
+    for name in names:
+        exported[name] = [record_to_dict(record) for record in open_database(context, name).load_data()]
+    json.dump(exported if len(names) > 1 else exported[names[0]], output, indent=2, ensure_ascii=False)
+    output.write('\n')
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,146 @@
+""" Module to import records from CSV and JSON exports of password managers, does not depend on QT. """
+import csv
+import io
+import json
+import os
+
+from controller.passwords_file import Record
+from controller.vault_format import PROGRESS_STEP
+
+CSV_FORMAT = 'csv'
+JSON_FORMAT = 'json'    # one document: list of records or object with "items" list (Bitwarden)
+JSONL_FORMAT = 'jsonl'  # one record object per line, read line by line
+FORMATS = (CSV_FORMAT, JSON_FORMAT, JSONL_FORMAT)
+EXTENSIONS = {'.csv': CSV_FORMAT, '.json': JSON_FORMAT, '.jsonl': JSONL_FORMAT, '.ndjson': JSONL_FORMAT}
+
+# column names of Record fields in exports (lower case), the first found one is used:
+# Chrome (name, url, username, password), Firefox (url, username, password), KeePass (Account, Login Name,
+# Password, Web Site), Bitwarden (name, login_uri, login_username, login_password) and this manager
+FIELD_NAMES = {
+    'title': ('title', 'name', 'account'),
+    'username': ('username', 'login_username', 'login name', 'login', 'user', 'email'),
+    'password': ('password', 'login_password'),
+    'destination': ('destination', 'url', 'login_uri', 'uri', 'website', 'web site'),
+}
+
+
+def get_format(path):
+    """
+    Function to get import format by file extension.
+
+    :param path: path to file
+    :type path: str
+    :return: one of FORMATS
+    :rtype: str
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in EXTENSIONS:
+        raise ValueError('Unknown import format of "{}", supported extensions: {}.'.format(
+            path, ', '.join(sorted(EXTENSIONS))))
+    return EXTENSIONS[extension]
+
+
+def read_records(file, file_format, errors=None):
+    """
+    Function to read records from export one by one. CSV and JSON lines are read by lines,
+    JSON document is parsed at once.
+
+    :param file: text file
+    :param file_format: one of FORMATS
+    :type file_format: str
+    :param errors: list to collect messages about invalid records, they are skipped then;
+        ValueError is raised on the first invalid record if it is None
+    :type errors: list
+    :return: records
+    :rtype: generator of Record
+    """
+    if file_format == CSV_FORMAT:
+        items = csv.DictReader(file)
+    elif file_format == JSON_FORMAT:
+        document = json.load(file)
+        items = document.get('items', []) if isinstance(document, dict) else document
+    elif file_format == JSONL_FORMAT:
+        items = (json.loads(line) for line in file if line.strip())
+    else:
+        raise ValueError('Unknown import format {}.'.format(file_format))
+
+    for number, item in enumerate(items, 1):
+        try:
+            yield _get_record(item)
+        except ValueError as error:
+            message = 'record {}: {}'.format(number, error)
+            if errors is None:
+                raise ValueError(message)
+            errors.append(message)
+
+
+def import_file(database, file, file_format, progress=None, errors=None):
+    """
+    Function to append records of export to database, database file is written once (see
+    PasswordsFile.import_records), records are not held in memory.
+
+    :param database: database file
+    :type database: PasswordsFile
+    :param file: binary file with export
+    :param file_format: one of FORMATS
+    :type file_format: str
+    :param progress: function called with numbers of read and all bytes of file (0 if file size is unknown)
+        after every PROGRESS_STEP records, it can raise exception to cancel import (database is not changed then)
+    :type progress: callable
+    :param errors: list to collect messages about invalid records (see read_records)
+    :type errors: list
+    :return: number of imported records
+    :rtype: int
+    """
+    size = os.fstat(file.fileno()).st_size if file.seekable() else 0
+    records = read_records(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''), file_format, errors)
+    if progress is not None:
+        records = _report_progress(records, file, size, progress)
+    return database.import_records(records)
+
+
+def _get_record(item):
+    """
+    Function to make record of exported item.
+
+    :param item: exported record: column name <-> value
+    :type item: dict
+    :return: record
+    :rtype: Record
+    """
+    if not isinstance(item, dict):
+        raise ValueError('record is not an object')
+    if isinstance(item.get('login'), dict):  # Bitwarden JSON item
+        login = item['login']
+        uris = login.get('uris') or [{}]
+        item = {'name': item.get('name'), 'username': login.get('username'), 'password': login.get('password'),
+                'uri': uris[0].get('uri')}
+
+    fields = {name.lower().strip(): value for name, value in item.items() if isinstance(name, str)}
+    values = {}
+    for field, names in FIELD_NAMES.items():
+        values[field] = next((str(fields[name]) for name in names if fields.get(name)), '')
+    if not values['title']:  # Firefox has no titles
+        values['title'] = values['destination']
+    return Record(**values)
+
+
+def _report_progress(records, file, size, progress):
+    """
+    Function to report read bytes of file while records are read.
+
+    :param records: records read from file
+    :type records: generator of Record
+    :param file: binary file
+    :param size: file size
+    :type size: int
+    :param progress: function called with numbers of read and all bytes
+    :type progress: callable
+    :return: the same records
+    :rtype: generator of Record
+    """
+    for number, record in enumerate(records, 1):
+        yield record
+        if number % PROGRESS_STEP == 0:
+            progress(file.tell() if size else 0, size)
+    progress(size, size)
@@ -0,0 +1,211 @@
+""" Module with append-only encrypted journal of database changes. """
+import hashlib
+import hmac
+import os
+import struct
+from pathlib import Path
+
+from aes import kdf, modes
+from controller import vault_format
+
+# journal file:
+#
+#   | magic | snapshot id | KDF parameters | entry | entry | ... |
+#
+# snapshot id - nonce of vault the journal is applied to (zero bytes if there is no vault),
+# KDF parameters - parameters to derive journal key from password (the same as vault ones if vault exists),
+# entry       - | length | nonce | encrypted operation | tag |,
+# operation   - | code | record number | serialized record (for ADD and UPDATE) |,
+# tag         - HMAC-SHA256 of snapshot id, entry number, nonce and encrypted operation.
+#
+# Journal of another snapshot is stale (vault was compacted after it) and is ignored.
+# Incomplete last entry (crash during append) is dropped.
+MAGIC = b'AESJ'
+HEADER = struct.Struct('>4s{}sB{}sIBB'.format(modes.NONCE_SIZE, kdf.SALT_SIZE))
+ENTRY_LENGTH = struct.Struct('>I')
+OPERATION = struct.Struct('>BI')
+TAG_SIZE = hashlib.sha256().digest_size
+NO_SNAPSHOT = bytes(modes.NONCE_SIZE)
+
+ADD = 1
+DELETE = 2
+UPDATE = 3
+
+
+class Journal:
+    """
+    Journal class to append database changes and replay them over vault snapshot.
+    """
+    def __init__(self, path, password):
+        """
+        Journal initialization.
+
+        :param path: path to journal file
+        :type path: str
+        :param password: database password
+        :type password: str
+        """
+        self.path = path
+        self.password = password
+        self.kdf_parameters = None  # parameters for new journal, new ones are made if they are not set
+        self.__key = None
+        self.__mac_key = None
+        self.__count = None
+
+    def exists(self):
+        """
+        Method to check if journal file exists.
+
+        :return: check result
+        :rtype: bool
+        """
+        return Path(self.path).exists()
+
+    def size(self):
+        """
+        Method to get journal file size.
+
+        :return: size in bytes
+        :rtype: int
+        """
+        return Path(self.path).stat().st_size if self.exists() else 0
+
+    def append(self, snapshot_id, code, number, data=b''):
+        """
+        Method to append one operation to journal and flush it to disk.
+
+        :param snapshot_id: nonce of vault the journal is applied to
+        :type snapshot_id: bytes
+        :param code: operation code: ADD, DELETE or UPDATE
+        :type code: int
+        :param number: record number
+        :type number: int
+        :param data: serialized record
+        :type data: bytes
+        """
+        if not self.exists() or self.__read_snapshot_id() != snapshot_id:
+            self.__create(snapshot_id)
+        if self.__count is None:
+            self.replay(snapshot_id)
+
+        nonce = os.urandom(modes.NONCE_SIZE)
+        encrypted = modes.ctr_crypt(OPERATION.pack(code, number) + data, self.__key, nonce)
+        tag = self.__get_tag(snapshot_id, self.__count, nonce, encrypted)
+        entry = nonce + encrypted + tag
+
+        with open(self.path, 'ab') as f:
+            f.write(ENTRY_LENGTH.pack(len(entry)) + entry)
+            f.flush()
+            os.fsync(f.fileno())
+        self.__count += 1
+
+    def replay(self, snapshot_id):
+        """
+        Method to read all operations of journal.
+
+        :param snapshot_id: nonce of vault the journal is applied to
+        :type snapshot_id: bytes
+        :return: list of operations: (code, record number, serialized record)
+        :rtype: list of tuples
+        """
+        self.__count = 0
+        if not self.exists():
+            return []
+
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        if len(data) < HEADER.size or data[:len(MAGIC)] != MAGIC:
+            raise ValueError('file is not a journal')
+        magic, journal_snapshot_id, *kdf_parameters = HEADER.unpack_from(data)
+        if journal_snapshot_id != snapshot_id:
+            return []  # stale journal
+        kdf_parameters = kdf.KdfParameters(*kdf_parameters)
+        kdf.check_parameters(kdf_parameters)
+        self.__set_key(kdf_parameters)
+
+        operations = []
+        position = HEADER.size
+        while position + ENTRY_LENGTH.size <= len(data):
+            length, = ENTRY_LENGTH.unpack_from(data, position)
+            begin = position + ENTRY_LENGTH.size
+            if begin + length > len(data):
+                break
+            entry = data[begin:begin + length]
+            nonce, encrypted, tag = entry[:modes.NONCE_SIZE], entry[modes.NONCE_SIZE:-TAG_SIZE], entry[-TAG_SIZE:]
+            if not hmac.compare_digest(tag, self.__get_tag(snapshot_id, len(operations), nonce, encrypted)):
+                raise PermissionError('journal entry {} is corrupted'.format(len(operations)))
+
+            operation = modes.ctr_crypt(encrypted, self.__key, nonce)
+            code, number = OPERATION.unpack_from(operation)
+            operations.append((code, number, operation[OPERATION.size:]))
+            position = begin + length
+
+        if position != len(data):  # incomplete last entry
+            with open(self.path, 'r+b') as f:
+                f.truncate(position)
+        self.__count = len(operations)
+        return operations
+
+    def remove(self):
+        """
+        Method to remove journal file.
+        """
+        if self.exists():
+            os.remove(self.path)
+        self.__count = 0
+
+    def __create(self, snapshot_id):
+        """
+        Private method to create empty journal for snapshot.
+
+        :param snapshot_id: nonce of vault the journal is applied to
+        :type snapshot_id: bytes
+        """
+        kdf_parameters = self.kdf_parameters if self.kdf_parameters is not None else kdf.new_parameters()
+        with open(self.path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, snapshot_id, *kdf_parameters))
+            f.flush()
+            os.fsync(f.fileno())
+        self.__set_key(kdf_parameters)
+        self.__count = 0
+
+    def __set_key(self, kdf_parameters):
+        """
+        Private method to derive journal keys from password.
+
+        :param kdf_parameters: KDF parameters of journal
+        :type kdf_parameters: kdf.KdfParameters
+        """
+        self.__key = kdf.derive_key(self.password, kdf_parameters)
+        self.__mac_key = vault_format.get_mac_key(self.__key)
+
+    def __read_snapshot_id(self):
+        """
+        Private method to read snapshot id from journal header.
+
+        :return: snapshot id or None for damaged header
+        :rtype: bytes
+        """
+        with open(self.path, 'rb') as f:
+            header = f.read(HEADER.size)
+        if len(header) < HEADER.size or header[:len(MAGIC)] != MAGIC:
+            return None
+        return HEADER.unpack(header)[1]
+
+    def __get_tag(self, snapshot_id, number, nonce, encrypted):
+        """
+        Private method to compute entry tag.
+
+        :param snapshot_id: nonce of vault the journal is applied to
+        :type snapshot_id: bytes
+        :param number: entry number
+        :type number: int
+        :param nonce: entry nonce
+        :type nonce: bytes
+        :param encrypted: encrypted operation
+        :type encrypted: bytes
+        :return: HMAC-SHA256
+        :rtype: bytes
+        """
+        message = snapshot_id + struct.pack('>Q', number) + nonce + encrypted
+        return hmac.new(self.__mac_key, message, hashlib.sha256).digest()
@@ -1,65 +1,313 @@
 """ Password Manager main QT window module. """
+import logging
 import os
-from pathlib import Path
-
-import pyperclip
 from threading import Thread
 from time import sleep
 
-from PyQt5 import uic, QtGui
+from PyQt5 import QtGui
+from PyQt5.QtCore import QThreadPool, QTimer
 from PyQt5.QtWidgets import QMainWindow
+from PyQt5.QtWidgets import QFileDialog
 from PyQt5.QtWidgets import QLineEdit
 from PyQt5.QtWidgets import QHeaderView
-from PyQt5.QtWidgets import QTableWidgetItem
 from PyQt5.QtWidgets import QInputDialog
+from PyQt5.QtWidgets import QProgressBar
+from PyQt5.QtWidgets import QPushButton
 
-from aes import aes
-from aes.transformations import apply_key_constraints as aes_password_constraints
+from controller.records_model import RecordsModel
+from controller.workers import Worker
 from controller.alerts import show_info_window, show_confirmation_window
 
+logger = logging.getLogger(__name__)
+
+# database modules (aes, numpy) and pyperclip are imported on first use, after the first dialog is shown
+UI_FILE = './view/main_window.ui'
+UI_MODULE = './view/main_window_ui.py'  # compiled by build_ui.py
+SEARCH_DELAY = 150  # milliseconds after the last change of search input before records are searched
+
+
+def setup_ui(window):
+    """
+    Function to create widgets of main window. Module compiled from UI file is used if it is up to date,
+    otherwise UI file is parsed at runtime.
+
+    :param window: main window
+    :type window: QMainWindow
+    """
+    if os.path.exists(UI_MODULE) and os.path.getmtime(UI_MODULE) >= os.path.getmtime(UI_FILE):
+        from view.main_window_ui import Ui_MainWindow
+        ui = Ui_MainWindow()
+        ui.setupUi(window)
+        # widgets are window attributes, the same as with uic.loadUi
+        for name, widget in vars(ui).items():
+            setattr(window, name, widget)
+    else:
+        from PyQt5 import uic
+        uic.loadUi(UI_FILE, window)
+
 
 class PasswordManager(QMainWindow):
     """
     PasswordManager main window.
+    Database is decrypted and compacted by workers in thread pool, window shows their progress in status bar.
     """
-    def closeEvent(self, *args, **kwargs):
-        super().closeEvent(*args, **kwargs)
-        self.database.save_data(self.records)
+    def closeEvent(self, event):
+        if self.worker is not None:
+            # changes are already in journal, so loading or compaction can be cancelled safely,
+            # window is closed when worker is stopped
+            self.closing = True
+            self.worker.cancel()
+            event.ignore()
+            return
+        if not self.closing and self.records is not None and self.database.needs_compaction():
+            # whole file is rewritten only to compact journal, to convert legacy file or to write
+            # the first snapshot of new database,
+            # window is closed when it is saved
+            self.closing = True
+            event.ignore()
+            self.save_database()
+            return
+        super().closeEvent(event)
 
     def __init__(self):
         """
         PasswordManager init function.
         """
         super().__init__()
-        uic.loadUi('./view/main_window.ui', self)
+        setup_ui(self)
         self.clipboard_free = True
-        self.database, self.records = self.open_database()
+        self.database = None
+        self.records = None
+        self.search_index = None
+        self.model = None
+        self.worker = None
+        self.closing = False
+        self.search_generation = 0  # number of the last search, results of previous searches are dropped
+        self.db_name = self.ask_database_name()
         self.init_ui()
 
-    def open_database(self):
+        database = self.ask_password()
+        if database is None:
+            raise RuntimeError
+        self.load_database(database)
+
+    def ask_database_name(self):
         """
-        Method to open existing database or create new.
+        Method to ask name of existing database or new one.
 
-        :return: database file and records list
-        :rtype: tuple
+        :return: database name
+        :rtype: str
         """
         db_name, ok = QInputDialog.getText(self, 'Database name', 'Name:')
         if not ok:
             raise RuntimeError
+        return db_name
+
+    def ask_password(self):
+        """
+        Method to ask database password.
+
+        :return: database file or None if password dialog is closed
+        :rtype: PasswordsFile
+        """
+        from controller.passwords_file import PasswordsFile
 
         while True:
-            password, ok = QInputDialog.getText(self, '"{}" database password'.format(db_name), 'Password:',
+            password, ok = QInputDialog.getText(self, '"{}" database password'.format(self.db_name), 'Password:',
                                                 QLineEdit.Password)
-            if ok:
-                try:
-                    database = PasswordsFile(password=password, file_name=db_name, pwd='./db/')
-                    records = database.load_data()
-                    return database, records
-                except Exception as error:
-                    show_info_window('Incorrect password', 'Please try another password.', details=str(error))
-                    continue
+            if not ok:
+                return None
+            try:
+                database = PasswordsFile(password=password, file_name=self.db_name, pwd='./db/')
+                database.check_password()
+                return database
+            except Exception as error:
+                show_info_window('Incorrect password', 'Please try another password.', details=str(error))
+
+    def load_database(self, database):
+        """
+        Method to decrypt database in background, window shows loading state until it is done.
+
+        :param database: database file
+        :type database: PasswordsFile
+        """
+        self.database = database
+        self.start_worker(Worker(self.read_database, database), 'Unlocking database...',
+                          finished=self.database_loaded, failed=self.database_failed,
+                          cancelled=lambda: self.database_failed(None))
+
+    @staticmethod
+    def read_database(database, progress):
+        """
+        Static method to decrypt database and index its records, it is run in worker thread.
+        Whole vault is decrypted (by chunks), lazy PasswordsFile.open_records is not used here: search index
+        needs fields of every record, and records of big vaults are decrypted faster by chunks than one by one.
+        Window stays usable while it runs, open_records is for tools which read a few records (cli get).
+
+        :param database: database file
+        :type database: PasswordsFile
+        :param progress: function to report loaded and all records
+        :type progress: callable
+        :return: records store and search index
+        :rtype: tuple
+        """
+        from controller.record_store import RecordStore
+        from controller.search_index import SearchIndex
+
+        records = RecordStore(database.load_data(progress))
+        search_index = SearchIndex()
+        for record_id in records.ids():
+            search_index.add(record_id, records.get_fields(record_id))
+        return records, search_index
+
+    def database_loaded(self, result):
+        """
+        Method to show loaded records.
+
+        :param result: records store and search index
+        :type result: tuple
+        """
+        if self.closing:
+            self.close()
+            return
+        self.records, self.search_index = result
+        self.model = RecordsModel(self.records, self)
+        self.table_passwords.setModel(self.model)
+        self.filter_table()
+
+        from aes import stats
+        unlock_stats = stats.current()
+        if unlock_stats is not None:
+            unlock_stats.log(logger)
+            self.statusbar.showMessage('Unlocked: ' + unlock_stats.summary())
+
+    def database_failed(self, error):
+        """
+        Method to ask password again after failed or cancelled loading.
+
+        :param error: loading error, None if loading was cancelled
+        :type error: Exception
+        """
+        if self.closing:
+            self.close()
+            return
+        if error is not None:
+            show_info_window('Incorrect password', 'Please try another password.', details=str(error))
+        database = self.ask_password()
+        if database is None:
+            self.close()
+        else:
+            self.load_database(database)
+
+    def save_database(self):
+        """
+        Method to compact database in background and close window after it.
+        """
+        def saving_failed(error):
+            show_info_window('Database is not compacted', 'All changes are kept in journal.', details=str(error))
+            self.close()
+
+        self.start_worker(Worker(self.database.save_data, self.records), 'Saving database...',
+                          finished=lambda _: self.close(), failed=saving_failed, cancelled=self.close)
+
+    def import_database(self, path):
+        """
+        Method to import records of export file in background and reload database after it.
+
+        :param path: path to export file
+        :type path: str
+        """
+        def import_finished(result):
+            count, errors = result
+            if errors:
+                show_info_window('Records are imported', '{} records are imported, {} records are skipped.'.format(
+                    count, len(errors)), details='\n'.join(errors))
+            if self.closing:
+                self.close()
             else:
-                raise RuntimeError
+                self.load_database(self.database)
+
+        def import_failed(error):
+            show_info_window('Records are not imported', 'Database is not changed.', details=str(error))
+            if self.closing:
+                self.close()
+
+        self.start_worker(Worker(self.import_records, self.database, path), 'Importing records...',
+                          finished=import_finished, failed=import_failed,
+                          cancelled=lambda: self.close() if self.closing else None)
+
+    @staticmethod
+    def import_records(database, path, progress):
+        """
+        Static method to append records of export file to database, it is run in worker thread.
+
+        :param database: database file
+        :type database: PasswordsFile
+        :param path: path to export file
+        :type path: str
+        :param progress: function to report read and all bytes of file
+        :type progress: callable
+        :return: number of imported records and messages about skipped records
+        :rtype: tuple
+        """
+        from controller import importer
+
+        errors = []
+        with open(path, 'rb') as f:
+            count = importer.import_file(database, f, importer.get_format(path), progress, errors)
+        return count, errors
+
+    def start_worker(self, worker, message, finished, failed, cancelled):
+        """
+        Method to run worker in thread pool. Window is disabled and shows progress until worker is done.
+
+        :param worker: worker to run
+        :type worker: Worker
+        :param message: status bar message
+        :type message: str
+        :param finished: function called with result of worker
+        :type finished: callable
+        :param failed: function called with exception of worker
+        :type failed: callable
+        :param cancelled: function called after worker is cancelled
+        :type cancelled: callable
+        """
+        self.worker = worker
+        self.centralWidget().setEnabled(False)
+        self.statusbar.showMessage(message)
+        self.progress_bar.setRange(0, 0)
+        self.progress_bar.show()
+        self.button_cancel.show()
+
+        # worker is stopped before result handlers are called, so they can start another one
+        worker.signals.progress.connect(self.show_progress)
+        for signal, handler in ((worker.signals.finished, finished), (worker.signals.failed, failed),
+                                (worker.signals.cancelled, cancelled)):
+            signal.connect(self.stop_worker)
+            signal.connect(handler)
+        QThreadPool.globalInstance().start(worker)
+
+    def stop_worker(self, *args):
+        """
+        Method to enable window after worker is done.
+        """
+        self.worker = None
+        self.progress_bar.hide()
+        self.button_cancel.hide()
+        self.statusbar.clearMessage()
+        self.centralWidget().setEnabled(True)
+
+    def show_progress(self, done, total):
+        """
+        Method to show progress of worker.
+
+        :param done: number of processed items (records, bytes)
+        :type done: int
+        :param total: number of all items
+        :type total: int
+        """
+        self.progress_bar.setRange(0, total)
+        self.progress_bar.setValue(done)
 
     def init_ui(self):
         """
@@ -70,20 +318,30 @@ class PasswordManager(QMainWindow):
         self.input_password.setEchoMode(QLineEdit.Password)
         self.table_passwords.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
 
-        titles = self.__get_headers_tips()
-        for i in titles.keys():
-            self.table_passwords.horizontalHeaderItem(i).setToolTip(titles[i])
+        self.progress_bar = QProgressBar()
+        self.button_cancel = QPushButton('Cancel')
+        self.statusbar.addPermanentWidget(self.progress_bar)
+        self.statusbar.addPermanentWidget(self.button_cancel)
+        self.progress_bar.hide()
+        self.button_cancel.hide()
 
         self.button_add.clicked.connect(lambda: self.add_button_click_listener())
         self.button_copy.clicked.connect(lambda: self.copy_button_click_listener())
         self.button_delete.clicked.connect(lambda: self.delete_button_click_listener())
-
-        self.insert_records_to_table()
+        self.button_cancel.clicked.connect(lambda: self.cancel_button_click_listener())
+        self.button_import.clicked.connect(lambda: self.import_button_click_listener())
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DELAY)
+        self.search_timer.timeout.connect(lambda: self.filter_table())
+        self.input_search.textChanged.connect(lambda: self.search_timer.start())
 
     def add_button_click_listener(self):
         """
         Add button click listener.
         """
+        from controller.passwords_file import Record
+
         try:
             record = Record(title=self.input_title.text(),
                             username=self.input_username.text(),
@@ -93,8 +351,26 @@ class PasswordManager(QMainWindow):
             show_info_window('Some fields do not contain data', 'Please fill all fields to add new record.')
             return
         self.clear_all_inputs()
-        self.records.append(record)
-        self.insert_record_to_table(record)
+        self.database.add_record(record)
+        record_id = self.model.append_record(record)
+        self.search_index.add(record_id, self.records.get_fields(record_id))
+        self.filter_table()
+
+    def import_button_click_listener(self):
+        """
+        Import button click listener.
+        """
+        path, _ = QFileDialog.getOpenFileName(self, 'Import records', '',
+                                              'Password manager exports (*.csv *.json *.jsonl *.ndjson)')
+        if path:
+            self.import_database(path)
+
+    def cancel_button_click_listener(self):
+        """
+        Cancel button click listener.
+        """
+        if self.worker is not None:
+            self.worker.cancel()
 
     def copy_button_click_listener(self):
         """
@@ -112,8 +388,7 @@ class PasswordManager(QMainWindow):
             show_info_window('More than one row selected', 'Select only one row to copy password to clipboard')
             return
 
-        record = self.records[index]
-        self.__copy_to_clipboard(record.password)
+        self.__copy_to_clipboard(self.records.get_password(self.model.get_record_id(index)))
 
     def delete_button_click_listener(self):
         """
@@ -127,45 +402,54 @@ class PasswordManager(QMainWindow):
             show_info_window('More than one row selected', 'Select only one row to delete record')
             return
 
-        record = self.records[index]
+        record_id = self.model.get_record_id(index)
+        title, _, _ = self.records.get_fields(record_id)
         if show_confirmation_window('Confirm record deleting',
-                                    'Record "{}" will be deleted. Press OK to continue.'.format(record.title)):
-            del self.records[index]
-            self.clear_table()
-            self.insert_records_to_table()
+                                    'Record "{}" will be deleted. Press OK to continue.'.format(title)):
+            self.database.delete_record(self.records.position(record_id))
+            self.model.remove_row(index)
+            self.search_index.remove(record_id)
+            self.filter_table()  # running search can still return deleted record
 
-    def insert_records_to_table(self, records=None):
+    def filter_table(self):
         """
-        Method to set records list to table.
-
-        :param records: records for table
-        :type records: list
+        Method to search records by search input text in thread pool, so typing is not blocked by search
+        of big database. Only rows of found records are shown when search is done.
         """
-        if records is None:
-            records = self.records
-        for record in records:
-            self.insert_record_to_table(record)
+        self.search_timer.stop()
+        self.search_generation += 1
+        worker = Worker(self.search_records, self.search_index, self.input_search.text(), self.search_generation)
+        worker.signals.finished.connect(self.search_finished)
+        QThreadPool.globalInstance().start(worker)
 
-    def insert_record_to_table(self, record):
+    @staticmethod
+    def search_records(search_index, query, generation, progress):
+        """
+        Static method to search records, it is run in worker thread.
+
+        :param search_index: search index
+        :type search_index: SearchIndex
+        :param query: search input text
+        :type query: str
+        :param generation: number of search
+        :type generation: int
+        :param progress: function to report progress (not used, search is short)
+        :type progress: callable
+        :return: number of search and ids of found records
+        :rtype: tuple
         """
-        Method to add one record to table.
+        return generation, search_index.search(query)
 
-        :param record: record for table
-        :type record: Record
+    def search_finished(self, result):
         """
-        row = self.table_passwords.rowCount()
-        cells = self.__get_dict_from_record(record)
-
-        self.table_passwords.insertRow(row)
-        for cell in cells:
-            self.table_passwords.setItem(row, cell, QTableWidgetItem(cells[cell]))
+        Method to show only rows of found records, results of outdated searches are dropped.
 
-    def clear_table(self):
+        :param result: number of search and ids of found records
+        :type result: tuple
         """
-        Method to clear table.
-        """
-        for i in reversed(range(self.table_passwords.rowCount())):
-            self.table_passwords.removeRow(i)
+        generation, found = result
+        if generation == self.search_generation:
+            self.model.set_filter(found)
 
     def clear_all_inputs(self):
         """
@@ -199,6 +483,8 @@ class PasswordManager(QMainWindow):
         :param sec: period for clipboard clearing
         :type sec: int
         """
+        import pyperclip
+
         def clear_clipboard():
             self.clipboard_free = False
             message = 'Clipboard will be cleared in {} second{}...'
@@ -213,40 +499,6 @@ class PasswordManager(QMainWindow):
         thread = Thread(target=clear_clipboard)
         thread.start()
 
-    @staticmethod
-    def __get_dict_from_record(record, show_password=False):
-        """
-        Static method to convert record to dict with pairs: cell number <-> cell content
-
-        :param record: record to convert
-        :type record: Record
-        :param show_password: flag to show password or use '*' characters instead
-        :type show_password: bool
-        :return: converted record
-        :rtype: dict
-        """
-        return {
-            0: record.title,
-            1: record.username,
-            2: record.password if show_password else '*' * 6,
-            3: record.destination,
-        }
-
-    @staticmethod
-    def __get_headers_tips():
-        """
-        Static method to get tips for headers, pars: header number <-> tip content
-
-        :return: tips
-        :rtype: dict
-        """
-        return {
-            0: "record title",
-            1: "username, ip address, etc.",
-            2: "password, secret word",
-            3: "url, ssh, etc."
-        }
-
     @staticmethod
     def __get_test_records():
         """
@@ -255,6 +507,8 @@ class PasswordManager(QMainWindow):
         :return: list of records
         :rtype: list
         """
+        from controller.passwords_file import Record
+
         records = [Record('record 1', 'user 1', 'password_1', 'vk.com'),
                    Record('record 2', 'user 2', 'password_2', 'ssh 127.0.0.1'),
                    Record('record 3', 'user 3', 'password_3', 'telegram')]
@@ -262,123 +516,3 @@ class PasswordManager(QMainWindow):
 
     __NO_SELECTED = -1
     __FEW_SELECTED = -2
-
-
-class Record:
-    """
-    Record class to perform table and file record.
-    """
-    def __init__(self, title, username, password, destination):
-        """
-        Record initialization.
-
-        :param title: title of record
-        :type title: str
-        :param username: username
-        :type username: str
-        :param password: password
-        :type password: str
-        :param destination: type (url, ssh, etc.)
-        :type destination: str
-        """
-        if any(len(item) == 0 for item in [title, username, password, destination]):
-            raise ValueError('record init got empty strings')
-        self.title = title
-        self.username = username
-        self.password = password
-        self.destination = destination
-
-    def __repr__(self):
-        rec = 'title: ' + self.title + ', '
-        rec += 'username: ' + self.username + ', '
-        rec += 'password: ' + self.password + ', '
-        rec += 'destination: ' + self.destination
-        return rec
-
-
-class PasswordsFile:
-    """
-    PasswordsFile class to work with password manager file.
-    """
-    __FILE_NAME = 'passwords'
-
-    def __init__(self, password, file_name=None, pwd='../db/'):
-        """
-        PasswordsFile initialization.
-
-        :param password: database password
-        :type password: str
-        :param file_name: database name
-        :type file_name: str
-        :param pwd: path to file
-        :type pwd: str
-        """
-        aes_password_constraints(password)
-        self.db_file = pwd + (file_name if file_name else self.__FILE_NAME)
-        self.password = password
-
-    def load_data(self):
-        """
-        Method to load data from encrypted file.
-
-        :return: list of records from database file
-        :rtype: list
-        """
-        if Path(self.db_file).exists():
-            with open(self.db_file, 'rb') as f:
-                bytes_data = f.read()
-                raw_data = bytes_data.decode()
-            f.close()
-
-            encrypted_blocks = aes.message_to_bytes(raw_data)
-            decrypted_blocks = []
-            for block in encrypted_blocks:
-                decrypted_blocks.append(aes.decrypt(block, self.password))
-            decrypted_string = aes.blocks_to_message(decrypted_blocks)
-            items = decrypted_string.split(',')[:-1]
-
-            if len(raw_data) > 0 and len(items) == 0:
-                raise PermissionError('access to db denied (1)')
-            if len(items) % 4 != 0:
-                raise PermissionError('access to db denied (2)')
-
-            records = []
-            row = []
-            for item in items:
-                row.append(item)
-                if len(row) == 4:
-                    records.append(Record(title=row[0], username=row[1], password=row[2], destination=row[3]))
-                    row = []
-            return records
-        else:
-            return []
-
-    def save_data(self, records):
-        """
-        Method to encrypt and save encrypted data to file.
-
-        :param records:
-        :return:
-        """
-        # delete database file if no records
-        if len(records) == 0:
-            if Path(self.db_file).exists():
-                os.remove(self.db_file)
-            return
-
-        data = ''
-        for record in records:
-            data += '{title},{name},{password},{type},'.format(title=record.title,
-                                                               name=record.username,
-                                                               password=record.password,
-                                                               type=record.destination)
-        blocks = aes.message_to_blocks(data)
-        encrypted_blocks = []
-        for block in blocks:
-            encrypted_blocks.append(aes.encrypt(block, self.password))
-        encrypted = aes.blocks_to_message(encrypted_blocks)
-
-        with open(self.db_file, 'wb') as f:
-            bytes_data = encrypted.encode()
-            f.write(bytes_data)
-        f.close()
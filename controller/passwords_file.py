@@ -0,0 +1,630 @@
+""" Password manager database file module, does not depend on QT. """
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+from collections.abc import Sequence
+from contextlib import contextmanager
+from itertools import islice
+from pathlib import Path
+
+from aes import aes, batch, kdf, stats
+from controller import journal, vault_format
+
+
+class Record:
+    """
+    Record class to perform table and file record.
+    """
+    __slots__ = ('title', 'username', 'password', 'destination', 'extra')
+
+    def __init__(self, title, username, password, destination, extra=None):
+        """
+        Record initialization.
+
+        :param title: title of record
+        :type title: str
+        :param username: username
+        :type username: str
+        :param password: password
+        :type password: str
+        :param destination: type (url, ssh, etc.)
+        :type destination: str
+        :param extra: additional metadata fields: field tag <-> raw content
+        :type extra: dict
+        """
+        if any(len(item) == 0 for item in [title, username, password, destination]):
+            raise ValueError('record init got empty strings')
+        self.title = title
+        self.username = username
+        self.password = password
+        self.destination = destination
+        self.extra = extra if extra is not None else {}
+
+    def __repr__(self):
+        rec = 'title: ' + self.title + ', '
+        rec += 'username: ' + self.username + ', '
+        rec += 'password: ' + self.password + ', '
+        rec += 'destination: ' + self.destination
+        return rec
+
+
+class LazyRecords(Sequence):
+    """
+    LazyRecords class to access records of memory-mapped vault, records are decrypted on every access.
+    """
+    def __init__(self, vault):
+        """
+        LazyRecords initialization.
+
+        :param vault: opened vault
+        :type vault: vault_format.MappedVault
+        """
+        self.vault = vault
+
+    def __len__(self):
+        return len(self.vault)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        return record_from_bytes(self.vault.read(index))
+
+    def close(self):
+        """
+        Method to close vault file.
+        """
+        self.vault.close()
+
+
+# serialized record is a sequence of fields:
+#
+#   | tag (varint) | length (varint) | content | tag | length | content | ...
+#
+# RECORD_FIELDS tags hold UTF-8 strings of Record attributes, any other tag is kept in Record.extra
+# as raw bytes, so fields may contain any characters and new metadata fields can be added.
+RECORD_FIELDS = {1: 'title', 2: 'username', 3: 'password', 4: 'destination'}
+
+
+def record_to_bytes(record):
+    """
+    Function to serialize record for database file.
+
+    :param record: record to serialize
+    :type record: Record
+    :return: serialized record
+    :rtype: bytes
+    """
+    data = bytearray()
+    for tag, name in RECORD_FIELDS.items():
+        _write_field(data, tag, getattr(record, name).encode())
+    for tag, content in record.extra.items():
+        _write_field(data, tag, content)
+    return bytes(data)
+
+
+def record_from_bytes(data):
+    """
+    Function to deserialize record from database file in one pass.
+
+    :param data: serialized record
+    :type data: bytes
+    :return: record
+    :rtype: Record
+    """
+    fields = {}
+    extra = {}
+    position = 0
+    size = len(data)
+    while position < size:
+        # tags and lengths below 0x80 are one byte varints
+        tag = data[position]
+        if tag < 0x80:
+            position += 1
+        else:
+            tag, position = _read_varint(data, position)
+        length = data[position] if position < size else 0x80
+        if length < 0x80:
+            position += 1
+        else:
+            length, position = _read_varint(data, position)
+
+        end = position + length
+        if end > size:
+            raise ValueError('record field {} is truncated'.format(tag))
+        name = RECORD_FIELDS.get(tag)
+        if name is not None:
+            fields[name] = str(data[position:end], 'utf-8')
+        else:
+            extra[tag] = bytes(data[position:end])
+        position = end
+
+    if len(fields) != len(RECORD_FIELDS):
+        raise ValueError('record has no {} field'.format(', '.join(set(RECORD_FIELDS.values()) - set(fields))))
+    return Record(extra=extra, **fields)
+
+
+def _write_field(data, tag, content):
+    """
+    Function to append one field to serialized record.
+
+    :param data: serialized record
+    :type data: bytearray
+    :param tag: field tag
+    :type tag: int
+    :param content: field content
+    :type content: bytes
+    """
+    _write_varint(data, tag)
+    _write_varint(data, len(content))
+    data.extend(content)
+
+
+def _write_varint(data, value):
+    """
+    Function to append unsigned int as varint: 7 bits per byte, high bit is set in all bytes except last one.
+
+    :param data: buffer to append to
+    :type data: bytearray
+    :param value: value to append
+    :type value: int
+    """
+    while value > 0x7f:
+        data.append(value & 0x7f | 0x80)
+        value >>= 7
+    data.append(value)
+
+
+def _read_varint(data, position):
+    """
+    Function to read unsigned varint.
+
+    :param data: buffer to read from
+    :type data: bytes
+    :param position: position of varint
+    :type position: int
+    :return: value and position after varint
+    :rtype: tuple
+    """
+    value = 0
+    shift = 0
+    while True:
+        if position >= len(data):
+            raise ValueError('record is truncated')
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def read_file(path):
+    """
+    Function to read whole file.
+
+    :param path: path to file
+    :type path: str
+    :return: file content
+    :rtype: bytes
+    """
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def write_file_atomically(path, data, backups=0):
+    """
+    Function to replace file content so that file always has either old or new content (see open_file_atomically).
+
+    :param path: path to file
+    :type path: str
+    :param data: new file content
+    :type data: bytes
+    :param backups: number of backup files to keep
+    :type backups: int
+    """
+    with open_file_atomically(path, backups) as f:
+        f.write(data)
+
+
+@contextmanager
+def open_file_atomically(path, backups=0):
+    """
+    Function to write new file content by parts so that file always has either old or new content.
+    Data is written to temporary file in the same directory, on exit it is flushed to disk and renamed over the file,
+    on exception it is removed and file is not changed.
+    Old content is kept in one of backups rotating files (path.bak1 ... path.bakN, the oldest is reused):
+    backup is a hard link to the old file, so it costs one link and no copying.
+
+    :param path: path to file
+    :type path: str
+    :param backups: number of backup files to keep
+    :type backups: int
+    :return: binary file opened for writing (it is seekable)
+    :rtype: io.BufferedWriter
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+
+        if backups > 0 and os.path.exists(path):
+            slots = ['{}.bak{}'.format(path, i) for i in range(1, backups + 1)]
+            slot = min(slots, key=lambda name: os.path.getmtime(name) if os.path.exists(name) else -1)
+            if os.path.exists(slot):
+                os.remove(slot)
+            try:
+                os.link(path, slot)
+            except OSError:  # no hard links on this file system
+                shutil.copy2(path, slot)
+
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    # rename is durable only when directory entry is flushed too
+    try:
+        directory_descriptor = os.open(directory, os.O_RDONLY)
+    except OSError:  # directories can not be opened on Windows
+        return
+    try:
+        os.fsync(directory_descriptor)
+    finally:
+        os.close(directory_descriptor)
+
+
+class PasswordsFile:
+    """
+    PasswordsFile class to work with password manager file.
+    Files are written in binary vault format (see vault_format), legacy text files are still loaded
+    and are converted to vault format on next save.
+    Single changes are appended to journal next to database file, save_data compacts journal into new file.
+    """
+    __FILE_NAME = 'passwords'
+    __JOURNAL_SUFFIX = '.journal'
+    # journal is compacted when it is bigger than both limits
+    __COMPACTION_MIN_SIZE = 64 * 1024
+    __COMPACTION_RATIO = 0.5
+    DEFAULT_BACKUPS = 3
+
+    def __init__(self, password, file_name=None, pwd='../db/', backups=DEFAULT_BACKUPS):
+        """
+        PasswordsFile initialization.
+
+        :param password: database password
+        :type password: str
+        :param file_name: database name
+        :type file_name: str
+        :param pwd: path to file
+        :type pwd: str
+        :param backups: number of rotating backups of database file
+        :type backups: int
+        """
+        kdf.check_password(password)
+        self.db_file = pwd + (file_name if file_name else self.__FILE_NAME)
+        self.password = password
+        self.backups = backups
+        self.legacy = False
+        self.journal = journal.Journal(self.db_file + self.__JOURNAL_SUFFIX, password)
+        self.kdf_parameters = None  # KDF parameters of database file, new ones are made for new file
+        self.__snapshot_id = None
+
+    def load_data(self, progress=None):
+        """
+        Method to load data from encrypted file.
+
+        :param progress: function called with numbers of loaded and all records of vault file, it can raise
+            exception to cancel loading
+        :type progress: callable
+        :return: list of records from database file
+        :rtype: list
+        """
+        if not Path(self.db_file).exists():
+            self.__snapshot_id = journal.NO_SNAPSHOT
+            return self.__replay_journal([])
+
+        bytes_data = read_file(self.db_file)
+
+        self.legacy = not vault_format.is_vault(bytes_data)
+        self.__snapshot_id = self.__get_snapshot_id(bytes_data)
+        if self.legacy:
+            records = self.__load_legacy_data(bytes_data)
+        else:
+            reader = vault_format.VaultReader(bytes_data, self.password)
+            self.__set_kdf_parameters(reader.header.kdf)
+            records = []
+            for chunk in reader.read_chunks():
+                records.extend(record_from_bytes(data) for data in chunk)
+                if progress is not None:
+                    progress(len(records), len(reader))
+        return self.__replay_journal(records)
+
+    def check_password(self):
+        """
+        Method to check password without decrypting database file, only vault header is read.
+        Derived key is cached, so it is not derived again on loading.
+        Legacy files and journal without database file are checked on loading.
+        """
+        if not Path(self.db_file).exists():
+            return
+        with open(self.db_file, 'rb') as f:
+            data = f.read(vault_format.HEADER.size)
+        if vault_format.is_vault(data):
+            header = vault_format.read_header(data)
+            vault_format.get_key(header, self.password)
+            self.__set_kdf_parameters(header.kdf)
+
+    def open_records(self):
+        """
+        Method to open database file without decrypting records. File is memory-mapped, only index is
+        read and checked, every record is decrypted when it is accessed.
+        Legacy files and files with not compacted journal are loaded at once.
+
+        :return: records of database file
+        :rtype: LazyRecords or list
+        """
+        if not Path(self.db_file).exists() or self.journal.exists():
+            return self.load_data()
+
+        with open(self.db_file, 'rb') as f:
+            self.legacy = not vault_format.is_vault(f.read(len(vault_format.MAGIC)))
+        if self.legacy:
+            return self.load_data()
+        vault = vault_format.MappedVault(self.db_file, self.password)
+        self.__set_kdf_parameters(vault.header.kdf)
+        self.__snapshot_id = vault.header.nonce
+        return LazyRecords(vault)
+
+    def save_data(self, records, progress=None):
+        """
+        Method to encrypt and save encrypted data to file.
+        File is replaced atomically, previous versions are kept in rotating backups.
+
+        :param records: records to save
+        :type records: iterable of Record
+        :param progress: function called with numbers of encrypted and all records, it can raise exception
+            to cancel saving (file is not changed then)
+        :type progress: callable
+        """
+        bytes_data = vault_format.pack_vault([record_to_bytes(record) for record in records], self.password,
+                                             progress, self.kdf_parameters)
+        self.__set_kdf_parameters(vault_format.read_header(bytes_data).kdf)
+        write_file_atomically(self.db_file, bytes_data, self.backups)
+        self.legacy = False
+        self.__snapshot_id = self.__get_snapshot_id(bytes_data)
+        self.journal.remove()
+
+    def import_records(self, records):
+        """
+        Method to append many records and write database file once. New records are serialized and encrypted
+        by chunks of vault_format.PROGRESS_STEP records while they are read from iterable, records of vault file
+        are copied by chunks too, so neither of them are held in memory (only vault index is).
+        Legacy file and file with journal are loaded at once. File is not changed if iterable raises exception.
+
+        :param records: new records, e.g. generator reading them from another manager export
+        :type records: iterable of Record
+        :return: number of imported records
+        :rtype: int
+        """
+        existing = []
+        copy_vault = Path(self.db_file).exists() and not self.journal.exists()
+        if copy_vault:
+            with open(self.db_file, 'rb') as f:
+                copy_vault = vault_format.is_vault(f.read(len(vault_format.MAGIC)))
+        if not copy_vault:
+            existing = self.load_data()
+
+        with open_file_atomically(self.db_file, self.backups) as f:
+            if copy_vault:
+                with vault_format.MappedVault(self.db_file, self.password) as vault:
+                    self.__set_kdf_parameters(vault.header.kdf)
+                    writer = vault_format.VaultWriter(f, self.password, self.kdf_parameters)
+                    for chunk in vault.read_chunks():
+                        writer.write(chunk)
+            else:
+                writer = vault_format.VaultWriter(f, self.password, self.kdf_parameters)
+                for first in range(0, len(existing), vault_format.PROGRESS_STEP):
+                    writer.write([record_to_bytes(record)
+                                  for record in existing[first:first + vault_format.PROGRESS_STEP]])
+            existing_count = len(writer)
+            iterator = iter(records)
+            while True:
+                chunk = [record_to_bytes(record) for record in islice(iterator, vault_format.PROGRESS_STEP)]
+                if not chunk:
+                    break
+                writer.write(chunk)
+            header = writer.close()
+
+        self.__set_kdf_parameters(header.kdf)
+        self.legacy = False
+        self.__snapshot_id = header.nonce
+        self.journal.remove()
+        return header.record_count - existing_count
+
+    def add_record(self, record):
+        """
+        Method to append new record to journal.
+
+        :param record: new record
+        :type record: Record
+        """
+        self.journal.append(self.__get_current_snapshot_id(), journal.ADD, 0, record_to_bytes(record))
+
+    def update_record(self, index, record):
+        """
+        Method to append record change to journal.
+
+        :param index: number of changed record
+        :type index: int
+        :param record: new record content
+        :type record: Record
+        """
+        self.journal.append(self.__get_current_snapshot_id(), journal.UPDATE, index, record_to_bytes(record))
+
+    def delete_record(self, index):
+        """
+        Method to append record deletion to journal.
+
+        :param index: number of deleted record
+        :type index: int
+        """
+        self.journal.append(self.__get_current_snapshot_id(), journal.DELETE, index)
+
+    def needs_compaction(self):
+        """
+        Method to check if database file should be rewritten with save_data: journal is big enough to be compacted,
+        loaded file is legacy text file, which is converted to vault format then, or new database has only journal
+        (snapshot is written, so it is protected by atomic write and backups).
+
+        :return: check result
+        :rtype: bool
+        """
+        if self.legacy:
+            return True
+        journal_size = self.journal.size()
+        if not Path(self.db_file).exists():
+            return journal_size > 0
+        db_size = Path(self.db_file).stat().st_size
+        return journal_size > self.__COMPACTION_MIN_SIZE and journal_size > db_size * self.__COMPACTION_RATIO
+
+    def migrate(self):
+        """
+        Method to convert legacy text database file to vault format.
+
+        :return: True if file was converted
+        :rtype: bool
+        """
+        records = self.load_data()
+        if not self.legacy:
+            return False
+        self.save_data(records)
+        return True
+
+    def __load_legacy_data(self, bytes_data):
+        """
+        Private method to load data from legacy text database file (decoded string of encrypted blocks).
+
+        :param bytes_data: file content
+        :type bytes_data: bytes
+        :return: list of records
+        :rtype: list
+        """
+        raw_data = bytes_data.decode()
+        encrypted_blocks = aes.message_to_bytes(raw_data)
+        decrypted = batch.decrypt_blocks(aes.blocks_to_bytes(encrypted_blocks), self.password)
+        decrypted_blocks = aes.bytes_to_blocks(decrypted)
+        decrypted_string = aes.blocks_to_message(decrypted_blocks)
+        items = decrypted_string.split(',')[:-1]
+
+        if len(raw_data) > 0 and len(items) == 0:
+            raise PermissionError('access to db denied (1)')
+        return self.__get_records(items)
+
+    def __replay_journal(self, records):
+        """
+        Private method to apply journal operations to records loaded from database file.
+
+        :param records: records of database file
+        :type records: list
+        :return: records with all changes
+        :rtype: list
+        """
+        for code, index, data in self.journal.replay(self.__snapshot_id):
+            if code == journal.ADD:
+                records.append(record_from_bytes(data))
+            elif code == journal.UPDATE:
+                records[index] = record_from_bytes(data)
+            elif code == journal.DELETE:
+                del records[index]
+            else:
+                raise ValueError('unknown journal operation {}'.format(code))
+        return records
+
+    def __set_kdf_parameters(self, kdf_parameters):
+        """
+        Private method to keep KDF parameters of database file, they are reused for next saves and for journal,
+        so key is derived only once.
+
+        :param kdf_parameters: KDF parameters
+        :type kdf_parameters: kdf.KdfParameters
+        """
+        self.kdf_parameters = kdf_parameters
+        self.journal.kdf_parameters = kdf_parameters
+
+    def __get_current_snapshot_id(self):
+        """
+        Private method to get snapshot id of database file, journal is bound to it.
+
+        :return: snapshot id
+        :rtype: bytes
+        """
+        if self.__snapshot_id is None:
+            if Path(self.db_file).exists():
+                # only header is read for vault, legacy file is hashed whole
+                with open(self.db_file, 'rb') as f:
+                    data = f.read(vault_format.HEADER.size)
+                    if not vault_format.is_vault(data):
+                        data += f.read()
+                self.__snapshot_id = self.__get_snapshot_id(data)
+            else:
+                self.__snapshot_id = journal.NO_SNAPSHOT
+        return self.__snapshot_id
+
+    @staticmethod
+    def __get_snapshot_id(bytes_data):
+        """
+        Static method to get snapshot id of database file content: vault nonce or hash of legacy file.
+
+        :param bytes_data: database file content
+        :type bytes_data: bytes
+        :return: snapshot id
+        :rtype: bytes
+        """
+        if vault_format.is_vault(bytes_data):
+            return vault_format.read_header(bytes_data).nonce
+        return hashlib.sha256(bytes_data).digest()[:len(journal.NO_SNAPSHOT)]
+
+    @staticmethod
+    def __get_records(items):
+        """
+        Static method to group record fields into records.
+
+        :param items: fields of all records
+        :type items: list of str
+        :return: list of records
+        :rtype: list
+        """
+        if len(items) % 4 != 0:
+            raise PermissionError('access to db denied (2)')
+
+        records = []
+        row = []
+        for item in items:
+            row.append(item)
+            if len(row) == 4:
+                records.append(Record(title=row[0], username=row[1], password=row[2], destination=row[3]))
+                row = []
+        return records
+
+
+_module = sys.modules[__name__]
+stats.register(_module, 'read_file', 'file read', lambda args, result: (0, len(result)))
+stats.register(_module, 'write_file_atomically', 'file write', lambda args, result: (0, len(args[1])))
+stats.register(_module, 'record_from_bytes', 'record decoding', lambda args, result: (0, len(args[0])))
+stats.register(_module, 'record_to_bytes', 'record encoding', lambda args, result: (0, len(result)))
+stats.register(PasswordsFile, 'load_data', 'load')
+stats.register(PasswordsFile, 'save_data', 'save')
+stats.register(PasswordsFile, 'import_records', 'import')
+stats.register(PasswordsFile, '_PasswordsFile__load_legacy_data', 'legacy load')
+stats.register(PasswordsFile, '_PasswordsFile__get_records', 'legacy records parsing')
+stats.register(journal.Journal, 'replay', 'journal replay')
+stats.register(vault_format, 'get_key', 'key derivation')
+stats.register(vault_format, '_get_tag', 'record tags', lambda args, result: (0, len(args[4])))
@@ -0,0 +1,340 @@
+""" Module with compact in-memory storage of records. """
+import os
+import secrets
+import string
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+
+from aes import modes
+from controller.passwords_file import Record
+
+
+class Column:
+    """
+    Column class to keep many strings as one UTF-8 buffer and array of end offsets, without object per string.
+    """
+    def __init__(self):
+        """
+        Column initialization.
+        """
+        self.data = bytearray()
+        self.ends = array('Q')
+
+    def __len__(self):
+        return len(self.ends)
+
+    def append(self, value):
+        """
+        Method to add value to the end of column.
+
+        :param value: value to add
+        :type value: bytes
+        """
+        self.data.extend(value)
+        self.ends.append(len(self.data))
+
+    def extend(self, values):
+        """
+        Method to add values to the end of column at once.
+
+        :param values: values to add
+        :type values: list of bytes
+        """
+        self.ends.extend(accumulate(map(len, values), initial=len(self.data)))
+        del self.ends[len(self.ends) - len(values) - 1]
+        self.data.extend(b''.join(values))
+
+    def get_strings(self, rows):
+        """
+        Method to get values of many rows as strings.
+
+        :param rows: rows of values
+        :type rows: iterable of ints
+        :return: values
+        :rtype: generator of str
+        """
+        data, ends = self.data, self.ends
+        for row in rows:
+            yield str(data[ends[row - 1] if row > 0 else 0:ends[row]], 'utf-8')
+
+    def get_range(self, row):
+        """
+        Method to get position of value in column data.
+
+        :param row: row of value
+        :type row: int
+        :return: begin and end of value
+        :rtype: tuple
+        """
+        return self.ends[row - 1] if row > 0 else 0, self.ends[row]
+
+    def get(self, row):
+        """
+        Method to get value.
+
+        :param row: row of value
+        :type row: int
+        :return: value
+        :rtype: bytes
+        """
+        begin, end = self.get_range(row)
+        return bytes(self.data[begin:end])
+
+    def get_str(self, row):
+        """
+        Method to get value as string.
+
+        :param row: row of value
+        :type row: int
+        :return: value
+        :rtype: str
+        """
+        begin, end = self.get_range(row)
+        return self.data[begin:end].decode()
+
+
+class RecordStore:
+    """
+    RecordStore class to keep records in columns (one buffer per field) instead of one object per record.
+    Every record gets id, which does not change while store exists.
+    Passwords column is encrypted in CTR mode with random session key, passwords are decrypted only
+    when record is requested.
+    Deleted rows are marked and removed from columns when they are a half of all rows.
+    """
+    __DELETED = -1
+
+    def __init__(self, records=()):
+        """
+        RecordStore initialization.
+
+        :param records: initial records
+        :type records: iterable of Record
+        """
+        alphabet = string.ascii_letters + string.digits
+        self.__key = ''.join(secrets.choice(alphabet) for _ in range(16))
+        self.__nonce = os.urandom(modes.NONCE_SIZE)
+        self.__rows = array('q')  # record id - 1 <-> row or __DELETED
+        self.__ids = array('Q')   # row <-> record id
+        self.__titles = Column()
+        self.__usernames = Column()
+        self.__passwords = Column()
+        self.__destinations = Column()
+        self.__extras = {}  # record id <-> extra fields, most of records have none
+        self.__deleted = 0
+        self.__live_rows = None  # rows without deleted ones, None if nothing is deleted
+        self.extend(records)
+
+    def __len__(self):
+        return len(self.__ids) - self.__deleted
+
+    def __contains__(self, record_id):
+        return 0 < record_id <= len(self.__rows) and self.__rows[record_id - 1] != self.__DELETED
+
+    def __iter__(self):
+        """
+        Iteration over records in insertion order, passwords column is decrypted at once.
+        """
+        rows = self.__get_live_rows()
+        passwords = Column()
+        passwords.data = modes.ctr_crypt(bytes(self.__passwords.data), self.__key, self.__nonce)
+        passwords.ends = self.__passwords.ends
+        extras = self.__extras
+        for row, title, username, password, destination in zip(
+                rows, self.__titles.get_strings(rows), self.__usernames.get_strings(rows),
+                passwords.get_strings(rows), self.__destinations.get_strings(rows)):
+            yield Record(title, username, password, destination, extras.get(self.__ids[row]) if extras else None)
+
+    def append(self, record):
+        """
+        Method to add record to the end of store.
+
+        :param record: record to add
+        :type record: Record
+        :return: id of new record
+        :rtype: int
+        """
+        return self.extend([record])[0]
+
+    def extend(self, records):
+        """
+        Method to add records to the end of store, passwords of all records are encrypted at once.
+
+        :param records: records to add
+        :type records: iterable of Record
+        :return: ids of new records
+        :rtype: list of ints
+        """
+        records = list(records)
+        first_id, first_row = len(self.__rows) + 1, len(self.__ids)
+        ids = list(range(first_id, first_id + len(records)))
+        self.__rows.extend(range(first_row, first_row + len(records)))
+        if self.__live_rows is not None:
+            self.__live_rows.extend(range(first_row, first_row + len(records)))
+        self.__ids.extend(ids)
+        self.__titles.extend([record.title.encode() for record in records])
+        self.__usernames.extend([record.username.encode() for record in records])
+        self.__destinations.extend([record.destination.encode() for record in records])
+        self.__extras.update((record_id, dict(record.extra)) for record_id, record in zip(ids, records) if record.extra)
+
+        passwords = [record.password.encode() for record in records]
+        offset = len(self.__passwords.data)
+        self.__passwords.extend(passwords)
+        encrypted = modes.ctr_crypt(bytes(self.__passwords.data[offset:]), self.__key, self.__nonce, offset)
+        self.__passwords.data[offset:] = encrypted
+        return ids
+
+    def delete(self, record_id):
+        """
+        Method to delete record by id.
+
+        :param record_id: id of record
+        :type record_id: int
+        """
+        row = self.__get_row(record_id)
+        self.__rows[record_id - 1] = self.__DELETED
+        self.__ids[row] = 0
+        self.__extras.pop(record_id, None)
+        self.__deleted += 1
+        if self.__live_rows is not None:
+            del self.__live_rows[bisect_left(self.__live_rows, row)]
+        if self.__deleted * 2 > len(self.__ids):
+            self.__compact()
+
+    def get(self, record_id):
+        """
+        Method to get record by id.
+
+        :param record_id: id of record
+        :type record_id: int
+        :return: record with decrypted password
+        :rtype: Record
+        """
+        return self.__get_record(self.__get_row(record_id), self.get_password(record_id))
+
+    def get_password(self, record_id):
+        """
+        Method to decrypt password of one record.
+
+        :param record_id: id of record
+        :type record_id: int
+        :return: password
+        :rtype: str
+        """
+        begin, end = self.__passwords.get_range(self.__get_row(record_id))
+        return modes.ctr_crypt(bytes(self.__passwords.data[begin:end]), self.__key, self.__nonce, begin).decode()
+
+    def get_fields(self, record_id):
+        """
+        Method to get not secret fields of record without decrypting password.
+
+        :param record_id: id of record
+        :type record_id: int
+        :return: title, username and destination
+        :rtype: tuple
+        """
+        row = self.__get_row(record_id)
+        return self.__titles.get_str(row), self.__usernames.get_str(row), self.__destinations.get_str(row)
+
+    def ids(self):
+        """
+        Method to get ids of all records in insertion order.
+
+        :return: ids
+        :rtype: list of ints
+        """
+        return [self.__ids[row] for row in self.__get_live_rows()]
+
+    def id_at(self, position):
+        """
+        Method to get id of record by its position in insertion order.
+
+        :param position: position of record
+        :type position: int
+        :return: id of record
+        :rtype: int
+        """
+        return self.__ids[self.__get_live_rows()[position]]
+
+    def position(self, record_id):
+        """
+        Method to get position of record in insertion order.
+
+        :param record_id: id of record
+        :type record_id: int
+        :return: position of record
+        :rtype: int
+        """
+        row = self.__get_row(record_id)
+        return row if self.__deleted == 0 else bisect_left(self.__get_live_rows(), row)
+
+    def __get_row(self, record_id):
+        """
+        Private method to get row of record.
+
+        :param record_id: id of record
+        :type record_id: int
+        :return: row
+        :rtype: int
+        """
+        if record_id not in self:
+            raise KeyError('record {} is not in store'.format(record_id))
+        return self.__rows[record_id - 1]
+
+    def __get_live_rows(self):
+        """
+        Private method to get not deleted rows, array is rebuilt only after deletion.
+
+        :return: rows in insertion order
+        :rtype: range or array
+        """
+        if self.__deleted == 0:
+            return range(len(self.__ids))
+        if self.__live_rows is None:
+            self.__live_rows = array('Q', (row for row, record_id in enumerate(self.__ids) if record_id != 0))
+        return self.__live_rows
+
+    def __get_record(self, row, password):
+        """
+        Private method to build record from row.
+
+        :param row: row of record
+        :type row: int
+        :param password: decrypted password
+        :type password: str
+        :return: record
+        :rtype: Record
+        """
+        return Record(self.__titles.get_str(row), self.__usernames.get_str(row), password,
+                      self.__destinations.get_str(row), self.__extras.get(self.__ids[row]))
+
+    def __compact(self):
+        """
+        Private method to remove deleted rows from columns. Passwords are encrypted again with new nonce,
+        because their positions in the stream are changed.
+        """
+        rows = self.__get_live_rows()
+        passwords = modes.ctr_crypt(bytes(self.__passwords.data), self.__key, self.__nonce)
+        old_ids, titles, usernames, destinations, old_passwords = \
+            self.__ids, self.__titles, self.__usernames, self.__destinations, self.__passwords
+
+        self.__ids = array('Q')
+        self.__titles, self.__usernames, self.__destinations = Column(), Column(), Column()
+        plain = bytearray()
+        ends = array('Q')
+        for row in rows:
+            self.__rows[old_ids[row] - 1] = len(self.__ids)
+            self.__ids.append(old_ids[row])
+            self.__titles.append(titles.get(row))
+            self.__usernames.append(usernames.get(row))
+            self.__destinations.append(destinations.get(row))
+            begin, end = old_passwords.get_range(row)
+            plain.extend(passwords[begin:end])
+            ends.append(len(plain))
+
+        self.__nonce = os.urandom(modes.NONCE_SIZE)
+        self.__passwords = Column()
+        self.__passwords.data = bytearray(modes.ctr_crypt(bytes(plain), self.__key, self.__nonce))
+        self.__passwords.ends = ends
+        self.__deleted = 0
+        self.__live_rows = None
@@ -0,0 +1,109 @@
+""" Module with QT table model over record store. """
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+HEADERS = ('Title', 'User Name', 'Password', 'Type')
+HEADERS_TIPS = ('record title', 'username, ip address, etc.', 'password, secret word', 'url, ssh, etc.')
+PASSWORD_COLUMN = 2
+HIDDEN_PASSWORD = '*' * 6
+
+
+class RecordsModel(QAbstractTableModel):
+    """
+    RecordsModel class to show records of store in QTableView. Only cells of visible rows are requested
+    by view, passwords are never decrypted for table.
+    """
+    def __init__(self, records, parent=None):
+        """
+        RecordsModel initialization.
+
+        :param records: records to show
+        :type records: RecordStore
+        :param parent: parent QT object
+        """
+        super().__init__(parent)
+        self.records = records
+        self.__found = None  # ids of records shown by filter, None to show all records
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.records) if self.__found is None else len(self.__found)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        if index.column() == PASSWORD_COLUMN:
+            return HIDDEN_PASSWORD
+        title, username, destination = self.records.get_fields(self.get_record_id(index.row()))
+        return (title, username, None, destination)[index.column()]
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation != Qt.Horizontal:
+            return super().headerData(section, orientation, role)
+        if role == Qt.DisplayRole:
+            return HEADERS[section]
+        if role == Qt.ToolTipRole:
+            return HEADERS_TIPS[section]
+        return None
+
+    def get_record_id(self, row):
+        """
+        Method to get id of record shown in row.
+
+        :param row: table row
+        :type row: int
+        :return: id of record
+        :rtype: int
+        """
+        return self.records.id_at(row) if self.__found is None else self.__found[row]
+
+    def append_record(self, record):
+        """
+        Method to add record to store. Row is inserted only if all records are shown, filter has to be
+        set again otherwise.
+
+        :param record: new record
+        :type record: Record
+        :return: id of new record
+        :rtype: int
+        """
+        if self.__found is not None:
+            return self.records.append(record)
+        row = len(self.records)
+        self.beginInsertRows(QModelIndex(), row, row)
+        record_id = self.records.append(record)
+        self.endInsertRows()
+        return record_id
+
+    def remove_row(self, row):
+        """
+        Method to delete record shown in row from store.
+
+        :param row: table row
+        :type row: int
+        :return: id of deleted record
+        :rtype: int
+        """
+        record_id = self.get_record_id(row)
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self.records.delete(record_id)
+        if self.__found is not None:
+            del self.__found[row]
+        self.endRemoveRows()
+        return record_id
+
+    def set_filter(self, found):
+        """
+        Method to show only found records.
+
+        :param found: ids of records in store order, None to show all records
+        :type found: list of ints
+        """
+        if found is None and self.__found is None:
+            return
+        self.beginResetModel()
+        self.__found = found
+        self.endResetModel()
@@ -0,0 +1,111 @@
+""" Module with in-memory search index over record fields. """
+import threading
+from array import array
+
+NGRAM_SIZE = 3
+MAX_POSTINGS = 4096
+
+
+class SearchIndex:
+    """
+    SearchIndex class to find records by part of title, username or destination (case insensitive).
+
+    Posting lists (record ids in order of adding) are kept for trigrams of queries: posting list of trigram
+    is built by one scan of all texts when the trigram is queried first time, then it is updated on every
+    add (ids of removed records are skipped on search and dropped with all posting lists when they are
+    a half of records). Candidates of query are taken from the shortest posting list of its trigrams and
+    checked against record text. Query which contains previous query (typing in filter box) is checked
+    only against previous results.
+    Methods can be called from different threads (search is run out of GUI thread).
+    """
+    def __init__(self):
+        """
+        SearchIndex initialization.
+        """
+        self.__texts = {}      # record id <-> lower case text of record fields
+        self.__postings = {}   # trigram <-> array of record ids
+        self.__last = None     # previous query and its results
+        self.__removed = 0     # removed records, which ids can be in posting lists
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__texts)
+
+    def add(self, record_id, fields):
+        """
+        Method to add record to index. Ids have to be added in increasing order.
+
+        :param record_id: id of record
+        :type record_id: int
+        :param fields: searchable fields of record: title, username, destination
+        :type fields: iterable of str
+        """
+        text = '\n'.join(fields).casefold()
+        with self.__lock:
+            self.__texts[record_id] = text
+            for key, posting in self.__postings.items():
+                if key in text:
+                    posting.append(record_id)
+            self.__last = None
+
+    def remove(self, record_id):
+        """
+        Method to remove record from index.
+
+        :param record_id: id of record
+        :type record_id: int
+        """
+        with self.__lock:
+            del self.__texts[record_id]
+            self.__removed += 1
+            if self.__removed > len(self.__texts):  # posting lists are mostly ids of removed records
+                self.__postings, self.__removed = {}, 0
+            if self.__last is not None:
+                self.__last = (self.__last[0], [i for i in self.__last[1] if i != record_id])
+
+    def search(self, query):
+        """
+        Method to find records.
+
+        :param query: part of record fields
+        :type query: str
+        :return: ids of found records in order of adding, None for empty query (all records)
+        :rtype: list of ints
+        """
+        with self.__lock:
+            query = query.strip().casefold()
+            if not query:
+                self.__last = None
+                return None
+
+            texts = self.__texts
+            if self.__last is not None and self.__last[0] in query:
+                candidates = self.__last[1]
+            elif len(query) < NGRAM_SIZE:
+                candidates = None
+            else:
+                keys = {query[i:i + NGRAM_SIZE] for i in range(len(query) - NGRAM_SIZE + 1)}
+                known = [self.__postings[key] for key in keys if key in self.__postings]
+                candidates = min(known, key=len) if known else self.__get_posting(keys.pop())
+
+            if candidates is None:
+                found = [record_id for record_id, text in texts.items() if query in text]
+            else:
+                found = [record_id for record_id in candidates if query in texts.get(record_id, '')]
+            self.__last = (query, found)
+            return list(found)  # caller can change result, previous results are kept for next search
+
+    def __get_posting(self, key):
+        """
+        Private method to build posting list of trigram.
+
+        :param key: trigram
+        :type key: str
+        :return: ids of records which contain trigram
+        :rtype: array
+        """
+        if len(self.__postings) >= MAX_POSTINGS:
+            del self.__postings[next(iter(self.__postings))]
+        posting = array('Q', (record_id for record_id, text in self.__texts.items() if key in text))
+        self.__postings[key] = posting
+        return posting
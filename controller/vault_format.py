@@ -0,0 +1,402 @@
+""" Module with binary password database (vault) container format. """
+import hashlib
+import hmac
+import io
+import mmap
+import os
+import struct
+from collections import namedtuple
+
+from aes import kdf, modes
+
+# vault file:
+#
+#   | header | records data | index |
+#
+# header       - magic, version, record count, KDF parameters, nonce, key check value, records data length, mac,
+# key          - AES key derived from password with KDF parameters (see aes.kdf), MAC key is derived from it,
+# key check    - truncated HMAC-SHA256 of nonce, so wrong password is rejected before index is read,
+# records data - all records encrypted as one CTR stream with nonce,
+# index        - one entry per record: offset and length in records data and record tag,
+# mac          - HMAC-SHA256 of header (with zero mac field) and index,
+# record tag   - truncated HMAC-SHA256 of nonce, record number, offset and encrypted record.
+#
+# Index is authenticated, but not encrypted (only record lengths are visible), so vault can be
+# opened in O(index size) and every record can be checked and decrypted alone.
+MAGIC = b'AESV'
+FORMAT_VERSION = 5
+HEADER = struct.Struct('>4sHIB{}sIBB{}s16sQ32s'.format(kdf.SALT_SIZE, modes.NONCE_SIZE))
+INDEX_ENTRY = struct.Struct('>QI16s')
+MAC_SIZE = hashlib.sha256().digest_size
+TAG_SIZE = 16
+PROGRESS_STEP = 4096  # records processed between progress callbacks
+
+VaultHeader = namedtuple('VaultHeader', 'version record_count kdf nonce check data_length mac')
+IndexEntry = namedtuple('IndexEntry', 'offset length tag')
+
+
+def is_vault(data):
+    """
+    Function to check if file content is binary vault (and not legacy text database).
+
+    :param data: file content
+    :type data: bytes
+    :return: check result
+    :rtype: bool
+    """
+    return data[:len(MAGIC)] == MAGIC
+
+
+def pack_vault(records, password, progress=None, kdf_parameters=None):
+    """
+    Function to encrypt records and pack them into vault.
+
+    :param records: serialized records
+    :type records: list of bytes
+    :param password: database password
+    :type password: str
+    :param progress: function called with numbers of packed and all records after every PROGRESS_STEP records
+    :type progress: callable
+    :param kdf_parameters: KDF parameters of vault, new ones (with new salt) are made if they are not set
+    :type kdf_parameters: kdf.KdfParameters
+    :return: vault file content
+    :rtype: bytes
+    """
+    output = io.BytesIO()
+    writer = VaultWriter(output, password, kdf_parameters)
+    for first in range(0, len(records), PROGRESS_STEP):
+        writer.write(records[first:first + PROGRESS_STEP])
+        if progress is not None:
+            progress(min(first + PROGRESS_STEP, len(records)), len(records))
+    writer.close()
+    return output.getvalue()
+
+
+class VaultWriter:
+    """
+    VaultWriter class to encrypt records and write vault to file by chunks, so records are not held in memory
+    (only index is, it is written after records data).
+    """
+    def __init__(self, file, password, kdf_parameters=None):
+        """
+        VaultWriter initialization. Space for header is reserved, header is written on close.
+
+        :param file: seekable binary file opened for writing
+        :param password: database password
+        :type password: str
+        :param kdf_parameters: KDF parameters of vault, new ones (with new salt) are made if they are not set
+        :type kdf_parameters: kdf.KdfParameters
+        """
+        if kdf_parameters is None:
+            kdf_parameters = kdf.new_parameters()
+        self.file = file
+        self.kdf_parameters = kdf_parameters
+        self.key = kdf.derive_key(password, kdf_parameters)
+        self.nonce = os.urandom(modes.NONCE_SIZE)
+        self.header = None
+        self.__mac_key = get_mac_key(self.key)
+        self.__index = bytearray()
+        self.__data_length = 0
+        self.__begin = file.tell()
+        file.write(bytes(HEADER.size))
+
+    def __len__(self):
+        return len(self.__index) // INDEX_ENTRY.size
+
+    def write(self, records):
+        """
+        Method to encrypt records with one CTR call and write them.
+
+        :param records: serialized records
+        :type records: list of bytes
+        """
+        ciphertext = modes.ctr_crypt(b''.join(records), self.key, self.nonce, self.__data_length)
+        position = 0
+        for number, record in enumerate(records, len(self)):
+            offset = self.__data_length + position
+            encrypted = ciphertext[position:position + len(record)]
+            self.__index.extend(INDEX_ENTRY.pack(offset, len(record),
+                                                 _get_tag(self.__mac_key, self.nonce, number, offset, encrypted)))
+            position += len(record)
+        self.file.write(ciphertext)
+        self.__data_length += len(ciphertext)
+
+    def close(self):
+        """
+        Method to write index and header. File is not closed.
+
+        :return: vault header
+        :rtype: VaultHeader
+        """
+        header = VaultHeader(FORMAT_VERSION, len(self), self.kdf_parameters, self.nonce,
+                             get_key_check(self.key, self.nonce), self.__data_length, bytes(MAC_SIZE))
+        mac = hmac.new(self.__mac_key, _pack_header(header) + self.__index, hashlib.sha256).digest()
+        self.header = header._replace(mac=mac)
+        self.file.write(self.__index)
+        end = self.file.tell()
+        self.file.seek(self.__begin)
+        self.file.write(_pack_header(self.header))
+        self.file.seek(end)
+        return self.header
+
+
+def unpack_vault(data, password):
+    """
+    Function to check and decrypt all records of vault at once.
+
+    :param data: vault file content
+    :type data: bytes
+    :param password: database password
+    :type password: str
+    :return: serialized records
+    :rtype: list of bytes
+    """
+    return VaultReader(data, password).read_all()
+
+
+def read_header(data):
+    """
+    Function to read vault header.
+
+    :param data: vault file content (at least header)
+    :type data: bytes
+    :return: vault header
+    :rtype: VaultHeader
+    """
+    if len(data) < HEADER.size or not is_vault(data):
+        raise ValueError('file is not a vault')
+    magic, version, record_count, *fields = HEADER.unpack_from(data)
+    kdf_parameters = kdf.KdfParameters(*fields[:len(kdf.KdfParameters._fields)])
+    header = VaultHeader(version, record_count, kdf_parameters, *fields[len(kdf.KdfParameters._fields):])
+    if header.version != FORMAT_VERSION:
+        raise ValueError('unsupported vault format version {}'.format(header.version))
+    kdf.check_parameters(header.kdf)
+    return header
+
+
+def get_key(header, password):
+    """
+    Function to derive vault key from password and check it with key check value of vault header,
+    it does not depend on vault size.
+
+    :param header: vault header
+    :type header: VaultHeader
+    :param password: database password
+    :type password: str
+    :return: vault key
+    :rtype: bytes
+    """
+    key = kdf.derive_key(password, header.kdf)
+    if not hmac.compare_digest(get_key_check(key, header.nonce), header.check):
+        raise PermissionError('access to db denied (key check)')
+    return key
+
+
+class VaultReader:
+    """
+    VaultReader class to check vault index and decrypt records on demand.
+    """
+    def __init__(self, data, password):
+        """
+        VaultReader initialization. Only header and index are read and checked.
+
+        :param data: vault file content, e.g. mmap of vault file
+        :type data: bytes or mmap.mmap
+        :param password: database password
+        :type password: str
+        """
+        self.data = data
+        self.password = password
+        self.header = read_header(data)
+        self.key = get_key(self.header, password)
+        self.__mac_key = get_mac_key(self.key)
+
+        index_begin = HEADER.size + self.header.data_length
+        index_end = index_begin + self.header.record_count * INDEX_ENTRY.size
+        if len(data) != index_end:
+            raise ValueError('vault size is {}, expected size is {}'.format(len(data), index_end))
+        self.index = data[index_begin:index_end]
+
+        mac = hmac.new(self.__mac_key, _pack_header(self.header._replace(mac=bytes(MAC_SIZE))) + self.index,
+                       hashlib.sha256).digest()
+        if not hmac.compare_digest(mac, self.header.mac):
+            raise PermissionError('access to db denied (mac)')
+
+    def __len__(self):
+        return self.header.record_count
+
+    def get_entry(self, number):
+        """
+        Method to get index entry of record.
+
+        :param number: record number
+        :type number: int
+        :return: index entry
+        :rtype: IndexEntry
+        """
+        if not 0 <= number < len(self):
+            raise IndexError('record number {} is out of range'.format(number))
+        return IndexEntry(*INDEX_ENTRY.unpack_from(self.index, number * INDEX_ENTRY.size))
+
+    def read(self, number):
+        """
+        Method to check and decrypt one record.
+
+        :param number: record number
+        :type number: int
+        :return: serialized record
+        :rtype: bytes
+        """
+        entry = self.get_entry(number)
+        begin = HEADER.size + entry.offset
+        encrypted = self.data[begin:begin + entry.length]
+        self.__check_tag(number, entry, encrypted)
+        return modes.ctr_crypt(encrypted, self.key, self.header.nonce, entry.offset)
+
+    def read_all(self, progress=None):
+        """
+        Method to check all records and decrypt them, records of every PROGRESS_STEP are decrypted at once.
+
+        :param progress: function called with numbers of read and all records after every PROGRESS_STEP records
+        :type progress: callable
+        :return: serialized records
+        :rtype: list of bytes
+        """
+        records = []
+        for chunk in self.read_chunks():
+            records.extend(chunk)
+            if progress is not None:
+                progress(len(records), len(self))
+        return records
+
+    def read_chunks(self):
+        """
+        Method to check and decrypt records by chunks of PROGRESS_STEP records. Records data is read once,
+        reading stops on the first chunk with changed record.
+
+        :return: serialized records of every chunk
+        :rtype: generator of lists of bytes
+        """
+        for first in range(0, len(self), PROGRESS_STEP):
+            entries = [self.get_entry(number) for number in range(first, min(first + PROGRESS_STEP, len(self)))]
+            begin = min(entry.offset for entry in entries)
+            end = max(entry.offset + entry.length for entry in entries)
+            if end > self.header.data_length:
+                raise ValueError('record {} is out of vault data'.format(first))
+            ciphertext = self.data[HEADER.size + begin:HEADER.size + end]
+            # encrypt-then-MAC: tags of chunk are checked before it is decrypted
+            for number, entry in enumerate(entries, first):
+                self.__check_tag(number, entry, ciphertext[entry.offset - begin:entry.offset + entry.length - begin])
+            plain_data = modes.ctr_crypt(ciphertext, self.key, self.header.nonce, begin)
+            yield [plain_data[entry.offset - begin:entry.offset + entry.length - begin] for entry in entries]
+
+    def __check_tag(self, number, entry, encrypted):
+        """
+        Private method to check record tag.
+
+        :param number: record number
+        :type number: int
+        :param entry: index entry of record
+        :type entry: IndexEntry
+        :param encrypted: encrypted record
+        :type encrypted: bytes
+        """
+        if len(encrypted) != entry.length or entry.offset + entry.length > self.header.data_length:
+            raise ValueError('record {} is out of vault data'.format(number))
+        tag = _get_tag(self.__mac_key, self.header.nonce, number, entry.offset, encrypted)
+        if not hmac.compare_digest(tag, entry.tag):
+            raise PermissionError('record {} is corrupted'.format(number))
+
+
+class MappedVault(VaultReader):
+    """
+    MappedVault class to open vault file with mmap, so only pages of read records are loaded from disk.
+    """
+    def __init__(self, path, password):
+        """
+        MappedVault initialization.
+
+        :param path: path to vault file
+        :type path: str
+        :param password: database password
+        :type password: str
+        """
+        with open(path, 'rb') as f:
+            self.__map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            super().__init__(self.__map, password)
+        except Exception:
+            self.__map.close()
+            raise
+
+    def close(self):
+        """
+        Method to unmap vault file.
+        """
+        self.__map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _pack_header(header):
+    """
+    Function to pack vault header.
+
+    :param header: vault header
+    :type header: VaultHeader
+    :return: packed header
+    :rtype: bytes
+    """
+    version, record_count, kdf_parameters, *fields = header
+    return HEADER.pack(MAGIC, version, record_count, *kdf_parameters, *fields)
+
+
+def get_mac_key(key):
+    """
+    Function to get MAC key for AES key, so AES key is not used directly in HMAC.
+
+    :param key: key derived from password
+    :type key: bytes
+    :return: MAC key
+    :rtype: bytes
+    """
+    return hashlib.sha256(b'vault mac key:' + key).digest()
+
+
+def get_key_check(key, nonce):
+    """
+    Function to compute key check value of vault.
+
+    :param key: key derived from password
+    :type key: bytes
+    :param nonce: vault nonce
+    :type nonce: bytes
+    :return: truncated HMAC-SHA256
+    :rtype: bytes
+    """
+    return hmac.new(get_mac_key(key), b'key check:' + nonce, hashlib.sha256).digest()[:TAG_SIZE]
+
+
+def _get_tag(mac_key, nonce, number, offset, encrypted):
+    """
+    Function to compute record tag.
+
+    :param mac_key: MAC key
+    :type mac_key: bytes
+    :param nonce: vault nonce
+    :type nonce: bytes
+    :param number: record number
+    :type number: int
+    :param offset: record offset in records data
+    :type offset: int
+    :param encrypted: encrypted record
+    :type encrypted: bytes
+    :return: truncated HMAC-SHA256
+    :rtype: bytes
+    """
+    message = nonce + struct.pack('>IQ', number, offset) + encrypted
+    return hmac.new(mac_key, message, hashlib.sha256).digest()[:TAG_SIZE]
@@ -0,0 +1,67 @@
+""" Module with QT workers to run long database operations out of GUI thread. """
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+
+
+class Cancelled(Exception):
+    """
+    Exception raised in worker thread to stop cancelled operation.
+    """
+
+
+class WorkerSignals(QObject):
+    """
+    WorkerSignals class with signals of worker, they are delivered to GUI thread.
+    """
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(Exception)
+    cancelled = pyqtSignal()
+
+
+class Worker(QRunnable):
+    """
+    Worker class to run function in QThreadPool. Function gets keyword argument progress: callable to report
+    numbers of done and all items, it raises Cancelled after cancel is called.
+    """
+    def __init__(self, function, *args):
+        """
+        Worker initialization.
+
+        :param function: function to run
+        :type function: callable
+        :param args: function arguments
+        """
+        super().__init__()
+        self.function = function
+        self.args = args
+        self.signals = WorkerSignals()
+        self.__cancelled = False
+
+    def run(self):
+        try:
+            result = self.function(*self.args, progress=self.__progress)
+        except Cancelled:
+            self.signals.cancelled.emit()
+        except Exception as error:
+            self.signals.failed.emit(error)
+        else:
+            self.signals.finished.emit(result)
+
+    def cancel(self):
+        """
+        Method to cancel operation, it is stopped on next progress report.
+        """
+        self.__cancelled = True
+
+    def __progress(self, done, total):
+        """
+        Private method to report progress of operation.
+
+        :param done: number of done items
+        :type done: int
+        :param total: number of all items
+        :type total: int
+        """
+        if self.__cancelled:
+            raise Cancelled
+        self.signals.progress.emit(done, total)
@@ -1,10 +1,34 @@
 """ Main module to run application. """
+import time
+START_TIME = time.perf_counter()  # before QT is imported
+
+import logging
 import sys
+from PyQt5.QtCore import QTimer
 from PyQt5.QtWidgets import QApplication
 from controller.password_manager import PasswordManager
 
+
+def report_startup_time():
+    """
+    Function to print time to first dialog and close it, so application exits.
+    """
+    print('time to first dialog: {:.3f} s'.format(time.perf_counter() - START_TIME))
+    dialog = QApplication.activeModalWidget()
+    if dialog is not None:
+        dialog.reject()
+
+
 if __name__ == '__main__':
+    # --stats shows timings of unlock stages in status bar and log, --stats=memory also traces peak memory
+    if '--stats' in sys.argv or '--stats=memory' in sys.argv:
+        from aes import stats
+        logging.basicConfig(level=logging.INFO)
+        stats.enable(trace_memory='--stats=memory' in sys.argv)
     app = QApplication(sys.argv)
+    if '--startup-time' in sys.argv:
+        # first dialog is modal, timer is fired in its event loop when dialog is shown
+        QTimer.singleShot(0, report_startup_time)
     try:
         window = PasswordManager()
         window.show()
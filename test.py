@@ -1,5 +1,11 @@
-""" Module with simple AES-128 test. """
-from aes import aes
+""" Module with simple AES-128 test and password database round trip checks. """
+import io
+import os
+import shutil
+import tempfile
+
+from aes import aes, batch, etm, kdf, modes, parallel
+from controller.passwords_file import PasswordsFile, Record, record_from_bytes, record_to_bytes
 
 if __name__ == '__main__':
     message = "The Advanced Encryption Standard (AES), also known by its original name Rijndael\n" \
@@ -25,3 +31,151 @@ if __name__ == '__main__':
     print(encrypted_message)
     print('\ndecrypted ({}):'.format(len(decrypted_message)))
     print(decrypted_message)
+
+    # all engines must give byte-identical output
+    reference = aes.Cipher('testpassword', aes.REFERENCE_ENGINE)
+    for engine in aes.ENGINES:
+        cipher = aes.Cipher('testpassword', engine)
+        for block in aes.message_to_blocks(message):
+            assert cipher.encrypt(block) == reference.encrypt(block)
+            assert cipher.decrypt(block) == reference.decrypt(block)
+        print('\nengine "{}": ok'.format(engine))
+
+    # batch engines: bytes and (N, 16) arrays below and above SMALL_BATCH_BLOCKS, default engine included
+    for count in (batch.SMALL_BATCH_BLOCKS - 1, batch.SMALL_BATCH_BLOCKS + 1):
+        data = os.urandom(count * batch.BLOCK_SIZE)
+        expected = b''.join(reference.encrypt(data[begin:begin + batch.BLOCK_SIZE])
+                            for begin in range(0, len(data), batch.BLOCK_SIZE))
+        inputs = [data]
+        if batch.HAS_NUMPY:
+            import numpy
+            inputs.append(numpy.frombuffer(data, dtype=numpy.uint8).reshape(-1, batch.BLOCK_SIZE))
+        for engine in (None,) + batch.BATCH_ENGINES:
+            for blocks in inputs:
+                encrypted = batch.encrypt_blocks(blocks, 'testpassword', engine)
+                assert type(encrypted) is type(blocks) and bytes(encrypted) == expected
+                assert bytes(batch.decrypt_blocks(encrypted, 'testpassword', engine)) == data
+    print('batch engines: ok')
+
+    # modes: CBC and CTR streams, CTR from any offset, parallel CTR equals CTR
+    data = os.urandom(5000)
+    nonce = os.urandom(modes.NONCE_SIZE)
+    encrypted = io.BytesIO()
+    modes.cbc_encrypt_stream(io.BytesIO(data), encrypted, 'testpassword', bytes(modes.IV_SIZE), buffer_size=1024)
+    decrypted = io.BytesIO()
+    modes.cbc_decrypt_stream(io.BytesIO(encrypted.getvalue()), decrypted, 'testpassword', bytes(modes.IV_SIZE),
+                             buffer_size=1024)
+    assert decrypted.getvalue() == data
+    encrypted = modes.ctr_crypt(data, 'testpassword', nonce)
+    assert modes.ctr_crypt(encrypted[1001:3003], 'testpassword', nonce, 1001) == data[1001:3003]
+    print('modes: ok')
+    assert parallel.ctr_crypt_parallel(data, 'testpassword', nonce, workers=2, chunk_size=1024) == encrypted
+    print('parallel CTR: ok')
+
+    # KDF: the same parameters give the same key, out of range parameters are rejected
+    kdf_parameters = kdf.KdfParameters(kdf.PBKDF2, bytes(kdf.SALT_SIZE), 1000, 0, 0)
+    key = kdf.derive_key('testpassword', kdf_parameters)
+    assert len(key) == kdf.KEY_SIZE and key == kdf.derive_key('testpassword', kdf_parameters)
+    assert key != kdf.derive_key('testpassword2', kdf_parameters)
+    try:
+        kdf.check_parameters(kdf_parameters._replace(cost=2 ** 32 - 1))
+        raise AssertionError('out of range KDF cost is accepted')
+    except ValueError:
+        print('kdf: ok')
+
+    # encrypt-then-MAC: round trip, changed stream and password instead of key are rejected
+    encrypted = io.BytesIO()
+    etm.encrypt_stream(io.BytesIO(data), encrypted, key, segment_size=1024)
+    decrypted = io.BytesIO()
+    etm.decrypt_stream(io.BytesIO(encrypted.getvalue()), decrypted, key)
+    assert decrypted.getvalue() == data
+    changed = bytearray(encrypted.getvalue())
+    changed[-100] ^= 1
+    for stream, stream_key in ((changed, key), (encrypted.getvalue(), 'testpassword')):
+        try:
+            etm.decrypt_stream(io.BytesIO(bytes(stream)), io.BytesIO(), stream_key)
+            raise AssertionError('changed stream or password is accepted')
+        except ValueError:
+            pass
+    print('encrypt-then-MAC: ok')
+
+    # database checks use the same cheap fixed KDF parameters, so they do not depend on calibration
+    records = [Record('title, with comma', 'user\nname', 'pässwörd', 'ssh 127.0.0.1', extra={9: b'\x00\xff'}),
+               Record('record 2', 'user 2', 'password_2', 'https://example.com')]
+    fields = [(r.title, r.username, r.password, r.destination, r.extra) for r in records]
+    directory = tempfile.mkdtemp() + os.sep
+    try:
+        # record codec: round trip, every truncated record is rejected
+        data = record_to_bytes(records[0])
+        assert (lambda r: (r.title, r.username, r.password, r.destination, r.extra))(record_from_bytes(data)) == \
+            fields[0]
+        # (record without extra fields, so no prefix ends at the last field)
+        data = record_to_bytes(records[1])
+        for length in range(len(data)):
+            try:
+                record_from_bytes(data[:length])
+            except ValueError:
+                continue
+            raise AssertionError('truncated record of {} bytes is accepted'.format(length))
+        print('\nrecord codec: ok')
+
+        # save and load, save keeps backup of previous file
+        database = PasswordsFile('testpassword', 'test', directory, backups=1)
+        database.kdf_parameters = kdf_parameters
+        database.save_data(records)
+        database.save_data(records)
+        loaded = PasswordsFile('testpassword', 'test', directory).load_data()
+        assert [(r.title, r.username, r.password, r.destination, r.extra) for r in loaded] == fields
+        assert os.path.exists(directory + 'test.bak1')
+        print('save and load: ok')
+
+        # journal: add, update and delete are replayed on load
+        database = PasswordsFile('testpassword', 'test', directory)
+        database.load_data()
+        database.add_record(Record('record 3', 'user 3', 'password_3', 'telegram'))
+        database.update_record(1, Record('record 2', 'user 2', 'changed', 'https://example.com'))
+        database.delete_record(0)
+        database.add_record(Record('record 4', 'user 4', 'password_4', 'vk.com'))
+        loaded = PasswordsFile('testpassword', 'test', directory).load_data()
+        assert [(r.title, r.password) for r in loaded] == \
+            [('record 2', 'changed'), ('record 3', 'password_3'), ('record 4', 'password_4')]
+        print('journal replay: ok')
+
+        # journal: truncated last entry (crash during append) is dropped, previous entries are kept
+        with open(directory + 'test.journal', 'r+b') as f:
+            f.truncate(os.path.getsize(directory + 'test.journal') - 3)
+        loaded = PasswordsFile('testpassword', 'test', directory).load_data()
+        assert [r.title for r in loaded] == ['record 2', 'record 3']
+        print('journal truncated entry: ok')
+
+        # new database: the first snapshot is written on close even if journal is small
+        database = PasswordsFile('testpassword', 'new', directory)
+        database.kdf_parameters = kdf_parameters
+        assert not database.needs_compaction()
+        database.add_record(records[1])
+        assert database.needs_compaction()
+        database.save_data(database.load_data())
+        assert os.path.exists(directory + 'new') and not database.needs_compaction()
+        print('new database snapshot: ok')
+
+        # changed vault data is detected
+        database = PasswordsFile('testpassword', 'test', directory)
+        database.save_data(database.load_data())
+        with open(directory + 'test', 'r+b') as f:
+            f.seek(-200, os.SEEK_END)  # inside records data, before index
+            byte = f.read(1)
+            f.seek(-1, os.SEEK_CUR)
+            f.write(bytes([byte[0] ^ 1]))
+        try:
+            PasswordsFile('testpassword', 'test', directory).load_data()
+            raise AssertionError('changed vault is loaded')
+        except PermissionError:
+            print('vault tamper detection: ok')
+
+        # legacy text database is loaded and is rewritten in vault format on close
+        shutil.copy('./db/sample', directory + 'legacy')
+        database = PasswordsFile('sample', 'legacy', directory)
+        assert len(database.load_data()) > 0 and database.legacy and database.needs_compaction()
+        print('legacy database: ok')
+    finally:
+        shutil.rmtree(directory)